@@ -0,0 +1,102 @@
+"""Микробенчмарк отрисовки календаря.
+
+Данные о занятости подставляются прямо в кэш календаря, поэтому
+измеряется только построение InlineKeyboardMarkup, без обращений к БД.
+Для сравнения - прежняя отрисовка, которая строила всю сетку заново при каждом
+вызове (callback_data - из текущего кодека, разметка совпадает с Calendar).
+
+    python bench/bench_calendar.py [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from cache import calendar_cache
+from callbacks import encode
+from tg_calendar import Calendar
+
+USER_ID = 42
+MONTHS = [(2026, month) for month in range(1, 13)]
+
+def prefill():
+    for year, month in MONTHS:
+        event_dates = frozenset(f"{year}-{month:02}-{day:02}" for day in range(1, 29, 3))
+        user_dates = frozenset(f"{year}-{month:02}-{day:02}" for day in range(1, 29, 9))
+        calendar_cache.month_dates.set((year, month), event_dates)
+        calendar_cache.user_dates.set((USER_ID, year, month), user_dates)
+
+async def legacy_create_calendar(year: int, month: int, user_id: int):
+    """Отрисовка в стиле прежнего Calendar.create_calendar"""
+    event_dates, user_event_dates = await calendar_cache.get_dates(year, month, user_id)
+    months_ru = [
+        'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+        'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
+    ]
+    keyboard = [
+        [InlineKeyboardButton(f"{months_ru[month-1]} {year}", callback_data=encode('ignore'))],
+        [InlineKeyboardButton(day, callback_data=encode('ignore'))
+         for day in ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]]
+    ]
+    first_day = datetime(year, month, 1)
+    last_day = datetime(year + month//12, month%12 + 1, 1) - timedelta(days=1)
+    week = [InlineKeyboardButton(" ", callback_data=encode('ignore')) for _ in range(first_day.weekday() % 7)]
+    for day in range(1, last_day.day + 1):
+        date_str = datetime(year, month, day).strftime("%Y-%m-%d")
+        has_events = date_str in event_dates
+        has_participation = date_str in user_event_dates
+        emoji = "📌" if has_participation else "|" if has_events else ""
+        day_str = f"{emoji}{day}{'|' if has_events and not has_participation else ''}"
+        week.append(InlineKeyboardButton(day_str, callback_data=encode('view', date_str)))
+        if len(week) == 7:
+            keyboard.append(week)
+            week = []
+    if week:
+        week += [InlineKeyboardButton(" ", callback_data=encode('ignore'))] * (7 - len(week))
+        keyboard.append(week)
+    prev_year, prev_month = (year-1, 12) if month == 1 else (year, month-1)
+    next_year, next_month = (year+1, 1) if month == 12 else (year, month+1)
+    keyboard.append([
+        InlineKeyboardButton("<", callback_data=encode('nav', (prev_year, prev_month))),
+        InlineKeyboardButton(">", callback_data=encode('nav', (next_year, next_month)))
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+async def run(render, seconds: float) -> float:
+    renders = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for year, month in MONTHS:
+            await render(year, month, USER_ID)
+        renders += len(MONTHS)
+    return renders / (time.perf_counter() - start)
+
+async def same_markup() -> bool:
+    for year, month in MONTHS:
+        legacy = await legacy_create_calendar(year, month, USER_ID)
+        current = await Calendar.create_calendar(year, month, USER_ID)
+        if legacy.to_dict() != current.to_dict():
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    prefill()
+    if not asyncio.run(same_markup()):
+        sys.exit("Разметка прежней и текущей отрисовки различается")
+    legacy = asyncio.run(run(legacy_create_calendar, args.seconds))
+    current = asyncio.run(run(Calendar.create_calendar, args.seconds))
+    print(f"прежняя отрисовка:        {legacy:,.0f} renders/s")
+    print(f"Calendar.create_calendar: {current:,.0f} renders/s ({current / legacy:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Микробенчмарк разбора и маршрутизации callback_data.
+
+Смесь данных кнопок календаря, карточки события и /myevents прогоняется через
+callbacks.decode и через CallbackRouter (разбор, поиск обработчика по таблице,
+замер времени маршрута) с пустыми обработчиками. Для сравнения - прежний разбор
+цепочкой startswith/split.
+
+    python bench/bench_callbacks.py [--seconds 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from callbacks import CallbackRouter, ROUTES, decode, encode
+
+SAMPLES = [
+    encode('view', '2026-10-20'),
+    encode('nav', (2026, 11)),
+    encode('details', 123456),
+    encode('join', 123456),
+    encode('leave', 123456),
+    encode('my_next', 1792479600, 123456),
+    encode('search', 20),
+    encode('ignore'),
+]
+LEGACY_SAMPLES = [
+    'view_2026-10-20', 'nav_2026-11', 'event_details_123456', 'event_join_123456',
+    'event_leave_123456', 'my_n_2026-10-20_123456_19:30', 'search_20', 'ignore',
+]
+
+def legacy_parse(data: str):
+    """Разбор в стиле прежнего button_handler"""
+    if data.startswith('edit_'):
+        return 'edit', int(data.split('_')[1])
+    elif data.startswith('delete_'):
+        return 'delete', int(data.split('_')[1])
+    elif data.startswith('nav_'):
+        return 'nav', tuple(map(int, data.split('_')[1].split('-')))
+    elif data.startswith('view_'):
+        return 'view', data.split('_')[1]
+    elif data.startswith('my_'):
+        _, direction, date, event_id, time = data.split('_', 4)
+        return 'my', direction, date, int(event_id), time
+    elif data.startswith('search_'):
+        return 'search', int(data.split('_')[1])
+    elif data.startswith('event_'):
+        parts = data.split('_')
+        return parts[1], int(parts[2])
+    return None
+
+def measure(func, samples: list, seconds: float) -> float:
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for data in samples:
+            func(data)
+        calls += len(samples)
+    return calls / (time.perf_counter() - start)
+
+async def measure_dispatch(seconds: float) -> float:
+    router = CallbackRouter()
+
+    async def noop(update, context, *args):
+        pass
+
+    for action in ROUTES:
+        router.route(action)(noop)
+
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for data in SAMPLES:
+            callback, handler = router.resolve(data)
+            await router.dispatch(callback, handler, None, None)
+        calls += len(SAMPLES)
+    return calls / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    longest = max(SAMPLES, key=lambda data: len(data.encode()))
+    print(f"Самые длинные данные: {longest!r} ({len(longest.encode())} байт)")
+    print(f"startswith-цепочка:   {measure(legacy_parse, LEGACY_SAMPLES, args.seconds):,.0f} разборов/с")
+    print(f"callbacks.decode:     {measure(decode, SAMPLES, args.seconds):,.0f} разборов/с")
+    print(f"CallbackRouter:       {asyncio.run(measure_dispatch(args.seconds)):,.0f} нажатий/с")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Нагрузочный тест параллельной обработки обновлений.
+
+Обновления нескольких пользователей прогоняются через PerUserUpdateProcessor
+с разным ограничением параллельности. Обработчик имитирует ожидание I/O
+(запрос к БД и Telegram) и проверяет, что обновления одного пользователя
+обрабатываются по порядку.
+
+    python bench/bench_concurrency.py [--users 200] [--updates 5] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from telegram import CallbackQuery, Update, User
+from update_processor import PerUserUpdateProcessor
+
+def make_updates(users: int, per_user: int) -> list:
+    updates = []
+    for seq in range(per_user):
+        for user_id in range(1, users + 1):
+            user = User(id=user_id, first_name='u', is_bot=False)
+            query = CallbackQuery(id=f'{user_id}-{seq}', from_user=user, chat_instance='bench', data=str(seq))
+            updates.append(Update(update_id=len(updates) + 1, callback_query=query))
+    return updates
+
+async def run(concurrency: int, updates: list, latency: float) -> float:
+    processor = PerUserUpdateProcessor(concurrency)
+    last_seen = {}
+    active = {}
+
+    async def handle(update: Update):
+        user_id = update.effective_user.id
+        seq = int(update.callback_query.data)
+        assert not active.get(user_id), "обновления одного пользователя обработаны параллельно"
+        assert last_seen.get(user_id, -1) == seq - 1, "нарушен порядок обновлений пользователя"
+        active[user_id] = True
+        await asyncio.sleep(latency)
+        active[user_id] = False
+        last_seen[user_id] = seq
+
+    started = time.perf_counter()
+    # Так же, как Application: каждое обновление - отдельная задача
+    await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+    return len(updates) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=5, help='обновлений на пользователя')
+    parser.add_argument('--latency', type=float, default=0.02, help='время обработки одного обновления, с')
+    args = parser.parse_args()
+
+    updates = make_updates(args.users, args.updates)
+    for concurrency in (1, 4, 16, 64, 256):
+        rate = asyncio.run(run(concurrency, updates, args.latency))
+        print(f"concurrency={concurrency:>3}: {rate:8,.0f} updates/s")
+
+if __name__ == '__main__':
+    main()
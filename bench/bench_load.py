@@ -0,0 +1,303 @@
+"""Нагрузочный тест бота целиком: Application из main.py против заглушки Bot API.
+
+Бот работает в режиме поллинга с настоящими обработчиками, кэшами и временной
+базой SQLite, обновления отдает FakeBotAPI. Виртуальные пользователи работают по
+замкнутому циклу: следующее обновление отправляется после обработки предыдущего.
+
+Сценарии:
+    calendar - /events и листание месяцев
+    dates    - просмотр дат и карточек событий
+    storm    - запись и отмена записи на одно событие с ограничением мест
+    admin    - создание и редактирование событий, выбор пользователя в меню админов
+    mixed    - все сценарии одновременно (40/40/15/5%)
+
+Для каждого сценария: обновлений в секунду, p50/p99 времени от постановки
+обновления в очередь getUpdates до конца его обработки, обращений к DatabaseHandler,
+SQL-запросов (без BEGIN/COMMIT) и запросов к Bot API на одно обновление.
+Заглушка работает в том же процессе и делит с ботом процессор, поэтому абсолютные
+числа ниже, чем на проде: результаты предназначены для сравнения версий между собой.
+
+    python bench/bench_load.py [--scenario all] [--users 50] [--seconds 10] [--api-latency 0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+# Окружение бота задается до импорта config: адрес заглушки, поллинг, метрики на свободном порту
+API_PORT = int(os.getenv('BENCH_API_PORT', '8199'))
+os.environ.update(
+    TELEGRAM_BOT_TOKEN='bench',
+    TELEGRAM_BASE_URL=f'http://127.0.0.1:{API_PORT}/bot',
+    METRICS_ENABLED='1',
+    METRICS_PORT='0',
+)
+os.environ.pop('WEBHOOK_URL', None)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import config
+
+# Временная база вместо /app/data
+DB_DIR = tempfile.mkdtemp(prefix='bench_load_')
+config.DB_NAME = os.path.join(DB_DIR, 'events.db')
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from callbacks import encode
+from config import USER_PAGE_SIZE
+from database import DatabaseHandler, init_database, pool
+from main import build_application
+from metrics import sql_duration, telegram_requests
+from fake_bot_api import FakeBotAPI
+
+SCENARIOS = ('calendar', 'dates', 'storm', 'admin', 'mixed')
+# Диапазоны id пользователей: у каждого сценария свои, чтобы не смешивать состояния диалогов
+USER_ID_STEP = 100000
+# Пользователи для страниц выбора администратора
+PICKER_USERS = 300
+RESPONSE_TIMEOUT = 30
+
+class World:
+    """Начальные данные: даты с событиями, события по датам и событие с ограничением мест"""
+    def __init__(self, days: int, users: int):
+        today = date.today()
+        self.dates = [(today + timedelta(days=day)).isoformat() for day in range(1, days + 1)]
+        self.events = {}
+        self.capped_date = (today + timedelta(days=days + 1)).isoformat()
+        self.capped_limit = max(1, users // 4)
+        self.capped_event = None
+
+    @property
+    def all_events(self) -> list:
+        return [event_id for ids in self.events.values() for event_id in ids]
+
+class StatementCounter:
+    """Число SQL-запросов всех соединений пула (trace callback SQLite)"""
+    SKIPPED = ('BEGIN', 'COMMIT', 'ROLLBACK', '--')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def install(self, connection_pool):
+        open_connection = connection_pool._open
+
+        def _open():
+            conn = open_connection()
+            conn.set_trace_callback(self._count)
+            return conn
+
+        connection_pool._open = _open
+
+    def _count(self, statement: str):
+        if not statement.lstrip().startswith(self.SKIPPED):
+            with self._lock:
+                self.value += 1
+
+def user_ids(scenario: str, users: int) -> list:
+    base = (SCENARIOS.index(scenario) + 1) * USER_ID_STEP
+    return [base + n for n in range(users)]
+
+def mixed_role(n: int) -> str:
+    return ('admin', 'storm', 'storm', 'storm', *['calendar'] * 8, *['dates'] * 8)[n % 20]
+
+def seed(world: World, users: int):
+    init_database()
+    everyone = [user_id for scenario in SCENARIOS for user_id in user_ids(scenario, users)]
+    everyone += range(1, PICKER_USERS + 1)
+    for user_id in everyone:
+        DatabaseHandler.update_user_info({
+            'id': user_id, 'first_name': f'User{user_id}', 'last_name': '', 'username': f'user{user_id}'
+        })
+        DatabaseHandler.update_contact(user_id, f'+7900{user_id:07}')
+
+    admins = user_ids('admin', users) + user_ids('mixed', users)[::20]
+    for user_id in admins:
+        DatabaseHandler.add_admin(user_id)
+
+    for day in world.dates:
+        world.events[day] = [
+            DatabaseHandler.create_event(day, event_time, f'Событие {day} {event_time}', 'Описание', admins[0], 20)
+            for event_time in ('10:00', '19:00')
+        ]
+    world.capped_event = DatabaseHandler.create_event(
+        world.capped_date, '12:00', 'Событие с ограничением мест', 'Описание', admins[0], world.capped_limit)
+
+def calendar_script(rng: random.Random, world: World):
+    yield 'message', '/events'
+    today = date.today()
+    while True:
+        month = today.month - 1 + rng.randint(-1, 3)
+        yield 'callback', encode('nav', (today.year + month // 12, month % 12 + 1))
+
+def dates_script(rng: random.Random, world: World):
+    yield 'message', '/events'
+    while True:
+        day = rng.choice(world.dates)
+        yield 'callback', encode('view', day)
+        yield 'callback', encode('details', rng.choice(world.events[day]))
+
+def storm_script(rng: random.Random, world: World):
+    while True:
+        yield 'callback', encode('join', world.capped_event)
+        yield 'callback', encode('details', world.capped_event)
+        yield 'callback', encode('leave', world.capped_event)
+
+def admin_script(rng: random.Random, world: World):
+    while True:
+        yield 'message', '/addevent'
+        yield 'callback', encode('view', rng.choice(world.dates))
+        yield 'message', 'Нагрузочное событие'
+        yield 'message', 'Описание'
+        yield 'message', '18:30'
+        yield 'message', '10'
+
+        yield 'callback', encode('edit', rng.choice(world.all_events))
+        yield 'callback', 'edit_time'
+        yield 'message', f'{rng.randint(8, 21):02}:00'
+
+        yield 'message', '/admins'
+        yield 'callback', 'admin_add'
+        yield 'callback', f'admin_users_{USER_PAGE_SIZE}'
+        yield 'callback', 'admin_users_prev'
+        yield 'message', 'user1'
+        yield 'callback', 'admin_back'
+        yield 'callback', 'admin_close'
+
+SCRIPTS = {
+    'calendar': calendar_script,
+    'dates': dates_script,
+    'storm': storm_script,
+    'admin': admin_script,
+}
+
+class Result:
+    def __init__(self):
+        self.latencies = []
+        self.timeouts = 0
+
+async def virtual_user(api: FakeBotAPI, pending: dict, user_id: int, script, deadline: float, result: Result):
+    loop = asyncio.get_running_loop()
+    for kind, payload in script:
+        if time.perf_counter() >= deadline:
+            return
+        update_id = api.message(user_id, payload) if kind == 'message' else api.callback(user_id, payload)
+        future = pending[update_id] = loop.create_future()
+        try:
+            finished_at = await asyncio.wait_for(future, RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            result.timeouts += 1
+            return
+        result.latencies.append(finished_at - api.sent_at.pop(update_id))
+
+def db_calls() -> int:
+    return sum(count for _, (_, _, count) in sql_duration.items())
+
+def api_calls() -> int:
+    return sum(value for key, value in telegram_requests.items() if dict(key).get('method') != 'getUpdates')
+
+async def run_scenario(scenario: str, args, api: FakeBotAPI, pending: dict, world: World,
+                       statements: StatementCounter, errors: list) -> dict:
+    ids = user_ids(scenario, args.users)
+    roles = [mixed_role(n) if scenario == 'mixed' else scenario for n in range(len(ids))]
+    before = db_calls(), statements.value, api_calls(), len(errors)
+
+    result = Result()
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    await asyncio.gather(*(
+        virtual_user(api, pending, user_id, SCRIPTS[role](random.Random(user_id), world), deadline, result)
+        for user_id, role in zip(ids, roles)
+    ))
+    elapsed = time.perf_counter() - started
+
+    processed = len(result.latencies) or 1
+    quantiles = statistics.quantiles(result.latencies, n=100, method='inclusive') if len(result.latencies) > 1 else [0] * 99
+    return {
+        'scenario': scenario,
+        'updates': len(result.latencies),
+        'rate': len(result.latencies) / elapsed,
+        'p50': quantiles[49] * 1000,
+        'p99': quantiles[98] * 1000,
+        'db': (db_calls() - before[0]) / processed,
+        'sql': (statements.value - before[1]) / processed,
+        'api': (api_calls() - before[2]) / processed,
+        'errors': len(errors) - before[3] + result.timeouts,
+    }
+
+async def run(args) -> list:
+    api = FakeBotAPI(args.api_latency / 1000)
+    await api.start(API_PORT)
+
+    pending = {}
+    errors = []
+
+    async def completed(update: Update, context):
+        # Группа после всех обработчиков бота: обновление обработано
+        future = pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def on_error(update, context):
+        if not errors:
+            print(f"Первая ошибка обработчика: {context.error!r}", file=sys.stderr)
+        errors.append(context.error)
+
+    application = build_application()
+    application.add_handler(TypeHandler(Update, completed), group=99)
+    application.add_error_handler(on_error)
+
+    world = World(args.days, args.users)
+    statements = StatementCounter()
+    statements.install(pool)
+    seed(world, args.users)
+
+    results = []
+    # Тот же порядок запуска, что и в Application.run_polling
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+    await application.start()
+    try:
+        scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+        for scenario in scenarios:
+            results.append(await run_scenario(scenario, args, api, pending, world, statements, errors))
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+        await api.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=('all',) + SCENARIOS, default='all')
+    parser.add_argument('--users', type=int, default=50, help='виртуальных пользователей в сценарии')
+    parser.add_argument('--seconds', type=float, default=10.0, help='длительность сценария, с')
+    parser.add_argument('--days', type=int, default=60, help='дней с событиями (по 2 события в день)')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа Bot API, мс')
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(DB_DIR, ignore_errors=True)
+
+    print(f"{'сценарий':<10}{'обновлений':>11}{'обн/с':>9}{'p50 мс':>9}{'p99 мс':>9}"
+          f"{'БД/обн':>9}{'SQL/обн':>9}{'API/обн':>9}{'ошибок':>8}")
+    for row in results:
+        print(f"{row['scenario']:<10}{row['updates']:>11}{row['rate']:>9.0f}{row['p50']:>9.1f}{row['p99']:>9.1f}"
+              f"{row['db']:>9.2f}{row['sql']:>9.2f}{row['api']:>9.2f}{row['errors']:>8}")
+
+if __name__ == '__main__':
+    main()
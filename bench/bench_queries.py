@@ -0,0 +1,224 @@
+"""Бенчмарк запросов DatabaseHandler на больших базах (см. bench/gen_dataset.py).
+
+Обработчики (handlers.py), календарь (tg_calendar.py через CalendarCache) и
+напоминания обращаются к SQLite только через методы DatabaseHandler, поэтому
+замеряется каждый такой метод в вариантах, которые встречаются в боте: первая
+и следующие страницы, пользователь с большим числом записей, поиск и т.п.
+Запросы каждого вызова перехватываются trace callback SQLite (с подставленными
+параметрами) и выводятся с планом EXPLAIN QUERY PLAN; полный просмотр таблицы
+и временное B-дерево для сортировки помечены знаком !.
+
+Изменяющие методы выполняются парами с обратным действием (запись и отмена
+записи, создание и удаление события), данные базы при этом не меняются, кроме
+счетчиков AUTOINCREMENT и id напоминаний перенесенного события.
+Если указать несколько баз, для каждой выводится медиана, а планы - для последней:
+
+    python bench/bench_queries.py /tmp/small.db /tmp/bench.db [--repeat 20]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import date
+from typing import NamedTuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import database
+from config import USER_PAGE_SIZE, SEARCH_PAGE_SIZE, MY_EVENTS_PAGE_SIZE, OUTBOX_BATCH_SIZE
+from database import ConnectionPool, DatabaseHandler, get_connection
+
+SKIPPED = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', '--')
+
+class CallSite(NamedTuple):
+    label: str
+    call: object
+    # Подготовка и обратное действие для изменяющих методов (не замеряются)
+    undo: object = None
+    setup: object = None
+
+class Measurement(NamedTuple):
+    median: float
+    p95: float
+    # Все выполненные запросы, в том числе каждая строка executemany
+    statements: list
+
+    def distinct_statements(self) -> list:
+        """По одному запросу каждого вида (без учета подставленных значений)"""
+        shapes = {}
+        for statement in self.statements:
+            shapes.setdefault(re.sub(r"'(?:[^']|'')*'|\b\d+\b", '?', statement), statement)
+        return list(shapes.values())
+
+def pick_params(conn) -> dict:
+    """Характерные параметры из самой базы: активный пользователь, загруженная дата и т.п."""
+    today = date.today().isoformat()
+    params = {'today': today, 'year': date.today().year, 'month': date.today().month}
+    params['heavy_user'] = conn.execute('''
+        SELECT user_id FROM participants GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()[0]
+    params['user'] = conn.execute('SELECT user_id FROM users ORDER BY user_id LIMIT 1 OFFSET ?', (
+        conn.execute('SELECT COUNT(*) FROM users').fetchone()[0] // 2,)).fetchone()[0]
+    params['user_info'] = dict(zip(('id', 'first_name', 'last_name', 'username'),
+                                   DatabaseHandler.get_user(params['user'])))
+    params['user_phone'] = DatabaseHandler.get_user_phone(params['user'])
+    params['admin'] = conn.execute('SELECT user_id FROM admins LIMIT 1').fetchone()[0]
+    params['non_admin'] = conn.execute('''
+        SELECT MAX(user_id) FROM users WHERE user_id NOT IN (SELECT user_id FROM admins)
+    ''').fetchone()[0]
+    params['busy_date'] = conn.execute('''
+        SELECT date FROM events WHERE date >= ? GROUP BY date ORDER BY COUNT(*) DESC LIMIT 1
+    ''', (today,)).fetchone()[0]
+    params['popular_event'], params['popular_date'] = conn.execute('''
+        SELECT id, date FROM events WHERE date >= ? ORDER BY participant_count DESC LIMIT 1
+    ''', (today,)).fetchone()
+    params['open_event'], params['open_time'] = conn.execute('''
+        SELECT id, time FROM events WHERE date >= ? AND max_participants = 0 ORDER BY date, id LIMIT 1
+    ''', (today,)).fetchone()
+    params['joiner'] = conn.execute('''
+        SELECT MAX(user_id) FROM users
+        WHERE user_id NOT IN (SELECT user_id FROM participants WHERE event_id = ?)
+    ''', (params['open_event'],)).fetchone()[0]
+    params['name_cursor'] = conn.execute('''
+        SELECT user_id FROM users ORDER BY name_key, user_id LIMIT 1 OFFSET 1000
+    ''').fetchone()[0]
+    # Совпадение по имени примерно на 50-й странице поиска
+    params['prefix_cursor'] = conn.execute('''
+        SELECT user_id FROM users WHERE name_key >= 'мар' AND name_key < 'мар\U0010ffff'
+        ORDER BY name_key, user_id LIMIT 1 OFFSET 1000
+    ''').fetchone()
+    page = DatabaseHandler.get_user_events_page(params['heavy_user'], MY_EVENTS_PAGE_SIZE)
+    params['my_cursor'] = (page[-1][4], page[-1][0]) if page else (0, 0)
+    return params
+
+def call_sites(p: dict) -> list:
+    h = DatabaseHandler
+    created = []
+
+    def create_event():
+        created.append(h.create_event(p['busy_date'], '12:00', 'Бенчмарк', 'Описание', p['admin'], 0))
+
+    return [
+        CallSite('get_user_phone', lambda: h.get_user_phone(p['user'])),
+        CallSite('is_admin', lambda: h.is_admin(p['user'])),
+        CallSite('get_user', lambda: h.get_user(p['user'])),
+        CallSite('get_admins', h.get_admins),
+        CallSite('get_admins_version', h.get_admins_version),
+        CallSite('get_admins_snapshot', h.get_admins_snapshot),
+        CallSite('get_admins_with_info', h.get_admins_with_info),
+        CallSite('get_event_dates', lambda: h.get_event_dates(p['year'], p['month'])),
+        CallSite('get_user_event_dates (heavy user)',
+                 lambda: h.get_user_event_dates(p['heavy_user'], p['year'], p['month'])),
+        CallSite('get_calendar_dates', lambda: h.get_calendar_dates(p['year'], p['month'], p['user'])),
+        CallSite('get_events_for_date (busy date)', lambda: h.get_events_for_date(p['busy_date'])),
+        CallSite('get_event_details (user)', lambda: h.get_event_details(p['popular_event'], p['user'])),
+        CallSite('get_event_details (admin, popular)',
+                 lambda: h.get_event_details(p['popular_event'], p['admin'], True)),
+        CallSite('get_users_page (first)', lambda: h.get_users_page(USER_PAGE_SIZE + 1)),
+        CallSite('get_users_page (after cursor)', lambda: h.get_users_page(USER_PAGE_SIZE + 1, p['name_cursor'])),
+        CallSite('get_users_page (prefix)', lambda: h.get_users_page(USER_PAGE_SIZE + 1, None, 'мар')),
+        CallSite('get_users_page (prefix, deep page)',
+                 lambda: h.get_users_page(USER_PAGE_SIZE + 1, (p['prefix_cursor'] or (None,))[0], 'мар')),
+        CallSite('get_user_events_page (first)',
+                 lambda: h.get_user_events_page(p['heavy_user'], MY_EVENTS_PAGE_SIZE + 1)),
+        CallSite('get_user_events_page (after)',
+                 lambda: h.get_user_events_page(p['heavy_user'], MY_EVENTS_PAGE_SIZE + 1, after=p['my_cursor'])),
+        CallSite('get_user_events_page (before)',
+                 lambda: h.get_user_events_page(p['heavy_user'], MY_EVENTS_PAGE_SIZE + 1, before=p['my_cursor'])),
+        CallSite('search_events (rare word)', lambda: h.search_events('хакатон', SEARCH_PAGE_SIZE + 1)),
+        CallSite('search_events (common word)', lambda: h.search_events('приходите', SEARCH_PAGE_SIZE + 1)),
+        CallSite('search_events (deep page)',
+                 lambda: h.search_events('йога', SEARCH_PAGE_SIZE + 1, 10 * SEARCH_PAGE_SIZE)),
+        CallSite('get_next_reminder_due', h.get_next_reminder_due),
+        CallSite('get_outbox_pending', lambda: h.get_outbox_pending(int(time.time()))),
+        CallSite('recover_outbox', h.recover_outbox),
+        CallSite('claim_outbox_batch (nothing due)', lambda: h.claim_outbox_batch(0, OUTBOX_BATCH_SIZE, 0, 0)),
+        CallSite('complete_outbox', lambda: h.complete_outbox(0, 'sent')),
+        CallSite('update_user_info', lambda: h.update_user_info(p['user_info'])),
+        CallSite('update_contact', lambda: h.update_contact(p['user'], p['user_phone'])),
+        CallSite('join_event', lambda: h.join_event(p['open_event'], p['joiner']),
+                 lambda: h.leave_event(p['open_event'], p['joiner'])),
+        CallSite('leave_event', lambda: h.leave_event(p['open_event'], p['joiner']),
+                 setup=lambda: h.join_event(p['open_event'], p['joiner'])),
+        CallSite('create_event', create_event, lambda: h.delete_event(created.pop())),
+        CallSite('delete_event', lambda: h.delete_event(created.pop()), setup=create_event),
+        CallSite('update_event (time)', lambda: h.update_event(p['open_event'], 'time', p['open_time'])),
+        CallSite('move_event (popular)', lambda: h.move_event(p['popular_event'], p['popular_date'])),
+        CallSite('add_admin', lambda: h.add_admin(p['non_admin']), lambda: h.remove_admin(p['non_admin'])),
+        CallSite('remove_admin', lambda: h.remove_admin(p['non_admin']), setup=lambda: h.add_admin(p['non_admin'])),
+    ]
+
+def measure(site: CallSite, repeat: int) -> Measurement:
+    conn = get_connection()
+    statements = []
+
+    def trace(statement: str):
+        statement = ' '.join(statement.split())
+        if not statement.startswith(SKIPPED):
+            statements.append(statement)
+
+    timings = []
+    # Первый вызов прогревает кэш страниц и собирает выполненные запросы
+    for attempt in range(repeat + 1):
+        if site.setup:
+            site.setup()
+        conn.set_trace_callback(trace if attempt == 0 else None)
+        started = time.perf_counter()
+        try:
+            site.call()
+        finally:
+            conn.set_trace_callback(None)
+        if attempt:
+            timings.append(time.perf_counter() - started)
+        if site.undo:
+            site.undo()
+    p95 = statistics.quantiles(timings, n=20, method='inclusive')[18] if len(timings) > 1 else timings[0]
+    return Measurement(statistics.median(timings) * 1000, p95 * 1000, statements)
+
+def print_plan(conn, statement: str):
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+    depth = {0: 0}
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        warning = '!' if re.match(r'SCAN \w+$', detail) or 'TEMP B-TREE' in detail else ' '
+        print(f"      {warning} {'  ' * (depth[node_id] - 1)}{detail}")
+
+def open_database(path: str):
+    # Все методы DatabaseHandler берут соединение из database.pool
+    if database.pool.path != path:
+        database.pool.close()
+        database.pool = ConnectionPool(path, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('databases', nargs='+', help='базы из bench/gen_dataset.py, от меньшей к большей')
+    parser.add_argument('--repeat', type=int, default=20, help='замеров на вызов')
+    args = parser.parse_args()
+
+    results = []
+    for path in args.databases:
+        open_database(os.path.abspath(path))
+        started = time.perf_counter()
+        params = pick_params(get_connection())
+        print(f"{path}: параметры выбраны за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+        results.append({site.label: measure(site, args.repeat) for site in call_sites(params)})
+
+    conn = get_connection()
+    names = [os.path.basename(path) for path in args.databases]
+    print(f"{'вызов':<38}" + ''.join(f"{name[:14]:>15}" for name in names) + f"{'p95':>13}{'запросов':>10}")
+    for label, last in results[-1].items():
+        medians = ''.join(f"{result[label].median:>12.3f} мс" for result in results)
+        print(f"{label:<38}{medians}{last.p95:>10.3f} мс{len(last.statements):>10}")
+
+    print("\nПланы запросов" + (f" ({names[-1]})" if len(names) > 1 else '') + ':')
+    for label, last in results[-1].items():
+        print(f"\n{label}: {last.median:.3f} мс")
+        for statement in last.distinct_statements():
+            print(f"    {statement[:160]}")
+            print_plan(conn, statement)
+    database.pool.close()
+
+if __name__ == '__main__':
+    main()
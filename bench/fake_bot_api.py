@@ -0,0 +1,123 @@
+"""Локальная заглушка Bot API для нагрузочных тестов.
+
+Отвечает на методы, которые вызывает бот (getMe, getUpdates, sendMessage,
+editMessageText, answerCallbackQuery и т.п.), и отдает через getUpdates
+синтетические обновления, поставленные в очередь методами message()/callback().
+Задержка ответа latency имитирует время до серверов Telegram.
+"""
+import asyncio
+import itertools
+import time
+from collections import Counter
+from aiohttp import web
+
+BOT_USER = {
+    'id': 1000000001, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot',
+    'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': True,
+    'can_connect_to_business': False, 'has_main_web_app': False,
+}
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        # update_id -> время постановки в очередь (perf_counter)
+        self.sent_at = {}
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._runner = None
+        self.port = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self, port: int = 0):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', port).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def message(self, user_id: int, text: str) -> int:
+        """Ставит в очередь текстовое сообщение (команда, если начинается с '/')"""
+        message = self._message(user_id, next(self._message_ids), text, _user(user_id))
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return self._push({'message': message})
+
+    def callback(self, user_id: int, data: str, message_id: int = 1) -> int:
+        """Ставит в очередь нажатие кнопки под сообщением бота message_id"""
+        return self._push({'callback_query': {
+            'id': f'{user_id}-{next(self._message_ids)}',
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': self._message(user_id, message_id, '...', BOT_USER),
+        }})
+
+    def _push(self, update: dict) -> int:
+        update_id = next(self._update_ids)
+        update['update_id'] = update_id
+        self._updates.append(update)
+        self.sent_at[update_id] = time.perf_counter()
+        self._new_updates.set()
+        return update_id
+
+    @staticmethod
+    def _message(chat_id: int, message_id: int, text: str, sender: dict) -> dict:
+        return {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': sender,
+            'text': text,
+        }
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        # Обновления с id меньше offset подтверждены ботом
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(params)})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id') or 0)
+            message_id = int(params.get('message_id') or next(self._message_ids))
+            result = self._message(chat_id, message_id, params.get('text', ''), BOT_USER)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
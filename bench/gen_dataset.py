@@ -0,0 +1,236 @@
+"""Генератор большой синтетической базы для бенчмарков запросов.
+
+Схема создается настоящими DatabaseHandler.init_db и миграциями, затем таблицы
+заполняются пачками: пользователи и контакты, события за прошедшие и будущие дни,
+участники (число на событие - экспоненциальное распределение, лимиты мест соблюдаются),
+ожидающие напоминания для будущих событий и отправленные - за последние дни.
+На время загрузки индексы и триггеры снимаются и затем создаются заново из
+sqlite_master, счетчики participant_count и индекс FTS строятся сразу целиком.
+Одинаковые --seed и размеры дают одинаковую базу.
+
+    python bench/gen_dataset.py --db /tmp/bench.db [--users 300000] [--events 2000000] [--participants 20000000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='путь к создаваемой базе (перезаписывается)')
+    parser.add_argument('--users', type=int, default=300_000)
+    parser.add_argument('--events', type=int, default=2_000_000)
+    parser.add_argument('--participants', type=int, default=20_000_000, help='записей на события, примерно')
+    parser.add_argument('--admins', type=int, default=20)
+    parser.add_argument('--days-back', type=int, default=3 * 365, help='события с этого числа дней назад')
+    parser.add_argument('--days-ahead', type=int, default=365, help='и до этого числа дней вперед')
+    parser.add_argument('--sent-days', type=int, default=30, help='дней истории отправленных напоминаний')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--analyze', action='store_true', help='собрать статистику ANALYZE после загрузки')
+    return parser.parse_args()
+
+ARGS = parse_args()
+# База задается до импорта database: пул соединений открывается по config.DB_NAME
+config.DB_NAME = os.path.abspath(ARGS.db)
+
+from database import DatabaseHandler, close_database, local_timestamp, reminder_schedule, user_name_key, username_key
+
+BATCH = 50_000
+
+FIRST_NAMES = [
+    'Александр', 'Алексей', 'Анна', 'Мария', 'Дмитрий', 'Екатерина', 'Иван', 'Ольга', 'Сергей', 'Татьяна',
+    'Андрей', 'Наталья', 'Михаил', 'Елена', 'Никита', 'Юлия', 'Павел', 'Ирина', 'Артём', 'Светлана',
+    'Максим', 'Дарья', 'Роман', 'Ксения', 'Игорь', 'Полина', 'Денис', 'Виктория', 'Егор', 'Алёна',
+    'John', 'Maria', 'Alex', 'Kate', 'Lena', 'Max', 'Nick', 'Sofia', 'Tim', 'Zoe',
+]
+LAST_NAMES = [
+    'Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Васильев', 'Петрова', 'Соколов', 'Михайлова', 'Новиков',
+    'Фёдорова', 'Морозов', 'Волкова', 'Алексеев', 'Лебедева', 'Семёнов', 'Егорова', 'Павлов', 'Козлова',
+    'Степанов', 'Николаева', 'Орлов', 'Андреева', 'Макаров', 'Захарова', 'Зайцев', 'Соловьёва', '',
+]
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+EVENT_KINDS = [
+    'Йога', 'Пробежка', 'Настольные игры', 'Лекция', 'Кинопоказ', 'Мастер-класс', 'Концерт', 'Турнир',
+    'Экскурсия', 'Встреча клуба', 'Воркшоп', 'Квиз', 'Танцы', 'Футбол', 'Волейбол', 'Шахматы',
+    'Разговорный английский', 'Книжный клуб', 'Велопрогулка', 'Хакатон',
+]
+EVENT_DETAILS = [
+    'для начинающих', 'в парке', 'на крыше', 'онлайн', 'для детей', 'выходного дня', 'по средам',
+    'с тренером', 'в библиотеке', 'на набережной', 'для продвинутых', 'в офисе', '',
+]
+WORDS = (
+    'приходите берите с собой воду удобную одежду хорошее настроение будет интересно встречаемся у входа '
+    'запись обязательна количество мест ограничено вход свободный после занятия чай обсуждение вопросы '
+    'ведущий расскажет покажет научит программа начало окончание регистрация участники команда призы'
+).split()
+TIMES = [f'{hour:02}:{minute:02}' for hour in range(8, 23) for minute in (0, 30)]
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def insert_batches(conn: sqlite3.Connection, sql: str, rows, label: str) -> int:
+    started = time.perf_counter()
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(sql, batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+        total += len(batch)
+    print(f"  {label}: {total:,} строк за {time.perf_counter() - started:.1f} с")
+    return total
+
+def generate_users(rng: random.Random, count: int):
+    for user_id in range(1, count + 1):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        username = f"{first_name.lower().translate(TRANSLIT)}_{user_id}" if rng.random() < 0.7 else ''
+        yield (user_id, first_name, last_name, username,
+               user_name_key(first_name, last_name, username), username_key(username))
+
+def generate_contacts(rng: random.Random, count: int):
+    for user_id in range(1, count + 1):
+        if rng.random() < 0.9:
+            yield user_id, f'+79{rng.randrange(10 ** 9):09}'
+
+def event_dates(args) -> list:
+    today = date.today()
+    first = today - timedelta(days=args.days_back)
+    return [(first + timedelta(days=day)).isoformat() for day in range(args.days_back + args.days_ahead + 1)]
+
+def generate_events(rng: random.Random, args, participant_counts: list, event_starts: list):
+    """События в порядке дат (как создаются на практике): id растет вместе с датой"""
+    dates = event_dates(args)
+    admins = range(1, args.admins + 1)
+    # Начало по (дата, время): пар на порядки меньше, чем событий
+    starts = {}
+    for index in range(args.events):
+        event_date = dates[index * len(dates) // args.events]
+        event_time = rng.choice(TIMES)
+        starts_at = starts.get((event_date, event_time))
+        if starts_at is None:
+            starts_at = starts[event_date, event_time] = local_timestamp(event_date, event_time)
+        event_starts[index] = starts_at
+        name = f"{rng.choice(EVENT_KINDS)} {rng.choice(EVENT_DETAILS)}".strip()
+        description = ' '.join(rng.choices(WORDS, k=rng.randint(5, 25)))
+        max_participants = rng.choice((0, 0, 10, 20, 50, 100))
+        count = participant_counts[index] = min(participant_counts[index], max_participants or args.users, args.users)
+        yield (index + 1, event_date, event_time, starts_at, config.TIMEZONE, name, description,
+               rng.choice(admins), max_participants, count)
+
+def generate_participants(rng: random.Random, args, participant_counts: list, event_starts: list):
+    population = range(1, args.users + 1)
+    for index, count in enumerate(participant_counts):
+        for user_id in sorted(rng.sample(population, count)):
+            yield index + 1, user_id, event_starts[index]
+
+def generate_outbox(conn: sqlite3.Connection, args):
+    """Ожидающие напоминания будущих событий и отправленные за последние sent_days дней"""
+    now = int(time.time())
+    since = (date.today() - timedelta(days=args.sent_days)).isoformat()
+    events = conn.execute('SELECT id, starts_at FROM events WHERE date >= ? ORDER BY id', (since,))
+    for event_id, starts_at in events.fetchall():
+        schedule = reminder_schedule(starts_at)
+        users = [row[0] for row in conn.execute('SELECT user_id FROM participants WHERE event_id = ?', (event_id,))]
+        for kind, due_at in schedule:
+            status, attempts = ('pending', 0) if due_at > now else ('sent', 1)
+            for user_id in users:
+                yield event_id, user_id, kind, due_at, status, attempts
+
+def main():
+    args = ARGS
+    rng = random.Random(args.seed)
+    os.makedirs(os.path.dirname(config.DB_NAME), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(config.DB_NAME + suffix):
+            os.remove(config.DB_NAME + suffix)
+
+    started = time.perf_counter()
+    DatabaseHandler.init_db()
+    close_database()
+
+    conn = connect(config.DB_NAME)
+    # Индексы и триггеры создаются после загрузки: так быстрее, а счетчики и FTS заполняются сразу
+    deferred = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+        ORDER BY type = 'trigger'
+    ''').fetchall()
+    for kind, name, _ in deferred:
+        conn.execute(f'DROP {kind.upper()} {name}')
+
+    print("Загрузка:")
+    conn.execute('BEGIN')
+    insert_batches(conn, '''
+        INSERT INTO users (user_id, first_name, last_name, username, name_key, username_key)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', generate_users(rng, args.users), 'users')
+    insert_batches(conn, 'INSERT INTO user_contacts (user_id, phone) VALUES (?, ?)',
+                   generate_contacts(rng, args.users), 'user_contacts')
+    conn.executemany('INSERT INTO admins (user_id) VALUES (?)', ((user_id,) for user_id in range(1, args.admins + 1)))
+
+    mean = args.participants / max(args.events, 1)
+    participant_counts = [int(rng.expovariate(1 / mean)) if mean else 0 for _ in range(args.events)]
+    event_starts = [None] * args.events
+    insert_batches(conn, '''
+        INSERT INTO events (id, date, time, starts_at, timezone, name, description, creator_id, max_participants,
+                            participant_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate_events(rng, args, participant_counts, event_starts), 'events')
+    insert_batches(conn, 'INSERT INTO participants (event_id, user_id, starts_at) VALUES (?, ?, ?)',
+                   generate_participants(rng, args, participant_counts, event_starts), 'participants')
+    conn.execute('COMMIT')
+
+    step = time.perf_counter()
+    for kind, name, sql in deferred:
+        if kind == 'index':
+            conn.execute(sql)
+    print(f"  индексы: {time.perf_counter() - step:.1f} с")
+
+    conn.execute('BEGIN')
+    insert_batches(conn, '''
+        INSERT INTO notification_outbox (event_id, user_id, kind, due_at, status, attempts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', generate_outbox(conn, args), 'notification_outbox')
+    step = time.perf_counter()
+    conn.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+    print(f"  events_fts: {time.perf_counter() - step:.1f} с")
+    for kind, name, sql in deferred:
+        if kind == 'trigger':
+            conn.execute(sql)
+    conn.execute('COMMIT')
+
+    if args.analyze:
+        step = time.perf_counter()
+        conn.execute('ANALYZE')
+        print(f"  ANALYZE: {time.perf_counter() - step:.1f} с")
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+    size = os.path.getsize(config.DB_NAME) / 1024 ** 2
+    print(f"Готово за {time.perf_counter() - started:.0f} с: {config.DB_NAME} ({size:,.0f} МБ), "
+          f"создано {datetime.now():%Y-%m-%d} - даты событий отсчитываются от этого дня")
+
+if __name__ == '__main__':
+    main()
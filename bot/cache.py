@@ -0,0 +1,207 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import (
+    CALENDAR_CACHE_SIZE, USER_CALENDAR_CACHE_SIZE, EVENT_CACHE_SIZE, EVENT_CACHE_TTL,
+    ADMIN_CACHE_CHECK_INTERVAL, RENDER_CACHE_SIZE
+)
+from database import db
+
+class LRUCache:
+    """Ограниченный по размеру кэш с вытеснением давно не использованных записей.
+
+    Используется только из цикла событий, поэтому блокировки не нужны.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Удаляет все записи, ключ которых удовлетворяет условию"""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class CalendarCache:
+    """Кэш занятости месяцев для Calendar.create_calendar.
+
+    month_dates: (year, month) -> даты с событиями
+    user_dates: (user_id, year, month) -> даты с участием пользователя
+    """
+    def __init__(self, month_size: int, user_size: int):
+        self.month_dates = LRUCache(month_size)
+        self.user_dates = LRUCache(user_size)
+        # Увеличивается при каждой инвалидации: результат запроса,
+        # начатого до инвалидации, не попадает в кэш
+        self._generation = 0
+
+    async def get_dates(self, year: int, month: int, user_id: int = None) -> tuple:
+        """Даты с событиями и даты с участием пользователя за месяц"""
+        event_dates = self.month_dates.get((year, month))
+        user_event_dates = self.user_dates.get((user_id, year, month)) if user_id else frozenset()
+        if event_dates is not None and user_event_dates is not None:
+            return event_dates, user_event_dates
+
+        generation = self._generation
+        fetched_events, fetched_user = await db.get_calendar_dates(year, month, user_id)
+        if generation == self._generation:
+            self.month_dates.set((year, month), frozenset(fetched_events))
+            if user_id:
+                self.user_dates.set((user_id, year, month), frozenset(fetched_user))
+        return frozenset(fetched_events), frozenset(fetched_user)
+
+    def invalidate_event_date(self, date: str, with_participants: bool = False):
+        """Событие на дату создано, удалено или перенесено.
+
+        with_participants - сбросить и даты участия пользователей за этот месяц
+        """
+        year, month = _year_month(date)
+        self._generation += 1
+        self.month_dates.pop((year, month))
+        if with_participants:
+            self.user_dates.discard_where(lambda key: key[1:] == (year, month))
+
+    def invalidate_user_date(self, user_id: int, date: str):
+        """Пользователь записался на событие или отменил запись"""
+        year, month = _year_month(date)
+        self._generation += 1
+        self.user_dates.pop((user_id, year, month))
+
+class EventDetailsCache:
+    """Короткоживущий кэш карточек событий: event_id -> {user_id: (expires_at, EventDetails)}.
+
+    Запись, отмена записи и редактирование сбрасывают все карточки события,
+    TTL ограничивает устаревание из-за изменений в других процессах.
+    """
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self._events = LRUCache(maxsize)
+        self._generation = 0
+
+    async def get(self, event_id: int, user_id: int):
+        is_admin = await admin_cache.is_admin(user_id)
+        entries = self._events.get(event_id)
+        if entries:
+            cached = entries.get(user_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+        generation = self._generation
+        details = await db.get_event_details(event_id, user_id, is_admin)
+        if details is not None and generation == self._generation:
+            entries = self._events.get(event_id)
+            if entries is None:
+                entries = {}
+                self._events.set(event_id, entries)
+            now = time.monotonic()
+            if len(entries) > 64:
+                for key in [key for key, (expires_at, _) in entries.items() if expires_at <= now]:
+                    del entries[key]
+            entries[user_id] = (now + self.ttl, details)
+        return details
+
+    def invalidate(self, event_id: int):
+        self._generation += 1
+        self._events.pop(event_id)
+
+    def clear(self):
+        self._generation += 1
+        self._events.clear()
+
+class AdminCache:
+    """Множество администраторов в памяти: проверка прав без запросов к БД.
+
+    Изменения этого процесса применяются сразу, изменения других процессов
+    обнаруживаются по счетчику meta.admins_version не реже раза в check_interval секунд.
+    """
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._admins = frozenset()
+        self._version = None
+        self._checked_at = 0.0
+
+    async def load(self):
+        self._version, self._admins = await db.get_admins_snapshot()
+        self._checked_at = time.monotonic()
+
+    async def _refresh(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        if await db.get_admins_version() != self._version:
+            await self.load()
+            event_cache.clear()
+
+    async def is_admin(self, user_id: int) -> bool:
+        await self._refresh()
+        return user_id in self._admins
+
+    async def add(self, user_id: int):
+        version = await db.add_admin(user_id)
+        self._apply(version, self._admins | {user_id})
+
+    async def remove(self, user_id: int):
+        version = await db.remove_admin(user_id)
+        self._apply(version, self._admins - {user_id})
+
+    def _apply(self, version: int, admins: frozenset):
+        # Если между нашими изменениями список менял другой процесс - перечитаем его
+        expected = None if self._version is None else self._version + 1
+        self._admins = frozenset(admins)
+        self._version = version
+        if version != expected:
+            self._checked_at = 0.0
+        event_cache.clear()
+
+class RenderCache:
+    """Отпечаток последнего отправленного вида сообщения: (chat_id, message_id) -> hash.
+
+    Отпечаток записывается после успешного редактирования и сбрасывается при ошибке
+    или удалении сообщения. Сообщения, изменяемые в обход кэша, в нем не учитываются.
+    """
+    def __init__(self, maxsize: int):
+        self._messages = LRUCache(maxsize)
+
+    @staticmethod
+    def fingerprint(text: str, reply_markup, options: dict) -> int:
+        # Разметка PTB хэшируется по содержимому кнопок
+        return hash((text, reply_markup, tuple(sorted(options.items()))))
+
+    def get(self, chat_id: int, message_id: int):
+        return self._messages.get((chat_id, message_id))
+
+    def set(self, chat_id: int, message_id: int, fingerprint: int):
+        self._messages.set((chat_id, message_id), fingerprint)
+
+    def forget(self, chat_id: int, message_id: int):
+        self._messages.pop((chat_id, message_id))
+
+def _year_month(date: str) -> tuple:
+    parsed = datetime.strptime(date, "%Y-%m-%d")
+    return parsed.year, parsed.month
+
+calendar_cache = CalendarCache(CALENDAR_CACHE_SIZE, USER_CALENDAR_CACHE_SIZE)
+event_cache = EventDetailsCache(EVENT_CACHE_TTL, EVENT_CACHE_SIZE)
+admin_cache = AdminCache(ADMIN_CACHE_CHECK_INTERVAL)
+render_cache = RenderCache(RENDER_CACHE_SIZE)
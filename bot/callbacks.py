@@ -0,0 +1,163 @@
+"""Кодек callback_data и таблица маршрутов кнопок.
+
+Формат: <версия><код действия>[|поле...], например '1v|20300101' (дата) или '1j|2s' (id в base36).
+Кнопки старого формата или с другой версией отклоняются, а не разбираются наугад.
+Локальные кнопки диалогов (admin_add, edit_name и т.п.) обрабатываются
+шаблонами ConversationHandler и в кодек не входят.
+"""
+import re
+import time
+from datetime import datetime
+from typing import NamedTuple
+from metrics import callback_duration, callback_rejected
+
+VERSION = '1'
+SEPARATOR = '|'
+# Ограничение Telegram на callback_data, байт
+MAX_LENGTH = 64
+
+class CallbackDataError(ValueError):
+    """callback_data не соответствует формату или не помещается в лимит"""
+
+class Field(NamedTuple):
+    pattern: re.Pattern
+    encode: object
+    decode: object
+
+def _base36(value: int) -> str:
+    if value < 0:
+        raise CallbackDataError(f"Отрицательное число: {value}")
+    digits = ''
+    while True:
+        value, rest = divmod(value, 36)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'[rest] + digits
+        if not value:
+            return digits
+
+def _decode_date(raw: str) -> str:
+    # Шаблон пропускает любые 8 цифр, несуществующая дата отклоняется здесь
+    try:
+        return datetime.strptime(raw, "%Y%m%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise CallbackDataError(f"Неверная дата: {raw!r}") from None
+
+FIELDS = {
+    # Неотрицательное целое (id, смещение, UTC epoch) в base36
+    'int': Field(re.compile(r'[0-9a-z]{1,13}'), _base36, lambda raw: int(raw, 36)),
+    # 'YYYY-MM-DD' <-> 'YYYYMMDD'
+    'date': Field(re.compile(r'\d{8}'), lambda value: value.replace('-', ''), _decode_date),
+    # (year, month) <-> 'YYYYMM'
+    'month': Field(re.compile(r'\d{4}(?:0[1-9]|1[0-2])'), lambda value: f"{value[0]:04}{value[1]:02}",
+                   lambda raw: (int(raw[:4]), int(raw[4:]))),
+}
+
+class Route(NamedTuple):
+    code: str
+    fields: tuple
+
+ROUTES = {
+    'ignore': Route('i', ()),
+    'nav': Route('n', ('month',)),
+    'view': Route('v', ('date',)),
+    'details': Route('d', ('int',)),
+    'join': Route('j', ('int',)),
+    'leave': Route('l', ('int',)),
+    'edit': Route('e', ('int',)),
+    'delete': Route('x', ('int',)),
+    # Курсоры /myevents: (starts_at, id) крайнего события страницы
+    'my_next': Route('mn', ('int', 'int')),
+    'my_prev': Route('mp', ('int', 'int')),
+    # Смещение результатов /search
+    'search': Route('s', ('int',)),
+}
+
+def _route_pattern(route: Route) -> re.Pattern:
+    # Одно регулярное выражение на маршрут: поля проверяются за один проход
+    fields = ''.join(f'\\{SEPARATOR}({FIELDS[field].pattern.pattern})' for field in route.fields)
+    return re.compile(re.escape(VERSION + route.code) + fields)
+
+_BY_CODE = {
+    route.code: (action, _route_pattern(route), tuple(FIELDS[field].decode for field in route.fields))
+    for action, route in ROUTES.items()
+}
+
+class Callback(NamedTuple):
+    action: str
+    args: tuple
+
+def encode(action: str, *values) -> str:
+    route = ROUTES[action]
+    if len(values) != len(route.fields):
+        raise CallbackDataError(f"{action}: ожидается полей {len(route.fields)}, передано {len(values)}")
+    parts = [VERSION + route.code]
+    for field_name, value in zip(route.fields, values):
+        field = FIELDS[field_name]
+        raw = field.encode(value)
+        if not field.pattern.fullmatch(raw):
+            raise CallbackDataError(f"{action}: значение {value!r} не подходит для поля {field_name}")
+        parts.append(raw)
+    data = SEPARATOR.join(parts)
+    if len(data.encode()) > MAX_LENGTH:
+        raise CallbackDataError(f"{action}: callback_data длиннее {MAX_LENGTH} байт")
+    return data
+
+def decode(data: str) -> Callback:
+    if not data or data[0] != VERSION:
+        raise CallbackDataError("Неизвестная версия")
+    code = data[1:].split(SEPARATOR, 1)[0]
+    try:
+        action, route_pattern, decoders = _BY_CODE[code]
+    except KeyError:
+        raise CallbackDataError(f"Неизвестное действие: {code!r}") from None
+    match = route_pattern.fullmatch(data)
+    if match is None:
+        raise CallbackDataError(f"{action}: неверные поля")
+    return Callback(action, tuple(field_decode(raw) for field_decode, raw in zip(decoders, match.groups())))
+
+def pattern(*actions):
+    """Шаблон для CallbackQueryHandler: данные кодека с одним из действий"""
+    codes = {ROUTES[action].code for action in actions}
+
+    def matches(data) -> bool:
+        if not isinstance(data, str) or not data.startswith(VERSION):
+            return False
+        return data[1:].split(SEPARATOR, 1)[0] in codes
+
+    return matches
+
+class CallbackRouter:
+    """Таблица маршрутов: действие -> обработчик(update, context, *поля)"""
+    def __init__(self):
+        self._handlers = {}
+
+    def route(self, action: str):
+        if action not in ROUTES:
+            raise KeyError(action)
+
+        def register(handler):
+            self._handlers[action] = handler
+            return handler
+
+        return register
+
+    def resolve(self, data: str):
+        """Разбирает данные кнопки; CallbackDataError, если разобрать или обработать нельзя"""
+        try:
+            callback = decode(data)
+        except CallbackDataError:
+            callback_rejected.inc(reason='malformed')
+            raise
+        handler = self._handlers.get(callback.action)
+        if handler is None:
+            callback_rejected.inc(reason='unrouted')
+            raise CallbackDataError(f"Нет обработчика для {callback.action}")
+        return callback, handler
+
+    async def dispatch(self, callback: Callback, handler, update, context):
+        started = time.perf_counter()
+        try:
+            return await handler(update, context, *callback.args)
+        finally:
+            callback_duration.observe(time.perf_counter() - started, route=callback.action)
+
+router = CallbackRouter()
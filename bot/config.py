@@ -1,11 +1,13 @@
 import os
 import logging
+from log import setup_logging
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Настройка логирования: LOG_FORMAT=json для структурированного вывода,
+# LOG_DEBUG_SAMPLE - доля записей DEBUG, которые попадают в лог (при LOG_LEVEL=DEBUG)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "1"))
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE)
 logger = logging.getLogger(__name__)
 
 # Константы
@@ -14,6 +16,102 @@ DEFAULT_ADMIN_ID = os.getenv("ADMIN_ID")
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Moscow")
 DB_NAME = "/app/data/" + DB_NAME
 
+# Адрес Bot API (можно указать локальный сервер для тестов)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+
+# Режим вебхука включается, если задан WEBHOOK_URL (публичный адрес бота), иначе - поллинг;
+# WEBHOOK_SECRET для него обязателен: Telegram передает его в каждом запросе
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Метрики в формате Prometheus: GET http://METRICS_LISTEN:METRICS_PORT/metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Миграции схемы: строк в одной транзакции пересчета и пауза между пачками, с
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.01"))
+
+# Сколько обновлений разных пользователей обрабатывается одновременно
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+# Сколько обновлений одного пользователя может ждать своей очереди; сверх этого они отбрасываются
+MAX_PENDING_PER_USER = int(os.getenv("MAX_PENDING_PER_USER", "8"))
+
+# Пул соединений SQLite
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+# Кэш календаря
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "256"))
+USER_CALENDAR_CACHE_SIZE = int(os.getenv("USER_CALENDAR_CACHE_SIZE", "10000"))
+
+# Кэш карточек событий
+EVENT_CACHE_SIZE = int(os.getenv("EVENT_CACHE_SIZE", "1000"))
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", "30"))
+
+# Отпечатки последнего вида сообщений с кнопками (пропуск повторных редактирований)
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "10000"))
+
+# Как часто сверять версию списка администраторов с БД (изменения из других процессов), с
+ADMIN_CACHE_CHECK_INTERVAL = float(os.getenv("ADMIN_CACHE_CHECK_INTERVAL", "5"))
+
+# Пользователей на странице выбора нового администратора
+USER_PAGE_SIZE = int(os.getenv("USER_PAGE_SIZE", "20"))
+
+# Результатов поиска событий на странице (/search и inline-режим)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+
+# Событий на странице /myevents
+MY_EVENTS_PAGE_SIZE = int(os.getenv("MY_EVENTS_PAGE_SIZE", "10"))
+
+def parse_offsets(value: str) -> list:
+    """'24h,1h,30m' -> [('24h', 86400), ('1h', 3600), ('30m', 1800)]"""
+    units = {'m': 60, 'h': 3600, 'd': 86400}
+    offsets = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        offsets.append((item, int(item[:-1]) * units[item[-1]]))
+    return offsets
+
+# Напоминания: за сколько до начала события их отправлять
+REMINDER_OFFSETS = parse_offsets(os.getenv("REMINDER_OFFSETS", "24h,1h"))
+
+# Рассылка напоминаний (лимиты Telegram: ~30 сообщений/с всего, ~1/с в один чат)
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "25"))
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "10"))
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv("NOTIFY_PER_CHAT_INTERVAL", "1"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+
+# Очередь напоминаний
+# Страховочная проверка очереди; основная отправка идет по таймеру ближайшего напоминания
+OUTBOX_POLL_INTERVAL = int(os.getenv("OUTBOX_POLL_INTERVAL", "600"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_MAX_LAG = int(os.getenv("OUTBOX_MAX_LAG", str(6 * 3600)))
+# Напоминание, которое столько секунд остается в отправке (ошибка записи результата, сбой
+# другого процесса), снова забирается в очередь
+OUTBOX_SENDING_LEASE = int(os.getenv("OUTBOX_SENDING_LEASE", "600"))
+
+# Хранение: события, начавшиеся больше RETENTION_DAYS дней назад, переносятся с участниками
+# в архивную БД ARCHIVE_DB_NAME (относительно каталога основной), завершенные напоминания
+# старше OUTBOX_RETENTION_DAYS удаляются; 0 - не выполнять
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "365"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+ARCHIVE_DB_NAME = os.getenv("ARCHIVE_DB_NAME", "archive.db")
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", str(24 * 3600)))
+# Событий и напоминаний в одной транзакции удаления, пауза между пачками, с
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+OUTBOX_PURGE_BATCH_SIZE = int(os.getenv("OUTBOX_PURGE_BATCH_SIZE", "5000"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+# Свободных страниц, возвращаемых системе за одну транзакцию incremental_vacuum
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+
 # Состояния ConversationHandler
 (NAME, DATE, EVENT_NAME, EVENT_DESCRIPTION, EVENT_TIME, EVENT_MAX, PHONE,
  EDIT_CHOICE, EDIT_NAME, EDIT_DESCRIPTION, EDIT_TIME, EDIT_DATE, EDIT_MAX,
@@ -1,10 +1,201 @@
+import asyncio
+import contextvars
+import functools
+import os
+import re
 import sqlite3
-from config import DB_NAME, DEFAULT_ADMIN_ID, logger
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+import pytz
+from config import (
+    DB_NAME, ARCHIVE_DB_NAME, DEFAULT_ADMIN_ID, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_STATEMENT_CACHE, TIMEZONE, REMINDER_OFFSETS, logger
+)
+from metrics import sql_duration
+
+class ConnectionPool:
+    """Пул долгоживущих соединений SQLite: по одному соединению на поток.
+
+    Запросы выполняются в собственном пуле потоков, поэтому цикл событий
+    бота не блокируется на дисковом I/O. WAL позволяет читателям работать
+    параллельно с писателем.
+    """
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db")
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_STATEMENT_CACHE,
+            check_same_thread=False
+        )
+        # До включения WAL: новая база создается с возвратом свободных страниц через
+        # incremental_vacuum, у существующей режим сменится при следующем VACUUM
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Дожидается выполнения запросов и закрывает все соединения"""
+        self.executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.execute('PRAGMA optimize')
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error("Ошибка закрытия соединения с БД: %s", e)
+            self._connections.clear()
+        self._local = threading.local()
+
+pool = ConnectionPool(DB_NAME, DB_POOL_SIZE)
+
+# localize в pytz занимает десятки микросекунд, а пары (дата, время) повторяются
+@functools.lru_cache(maxsize=4096)
+def local_timestamp(date: str, time: str = None, timezone: str = None) -> int:
+    """UTC epoch для локальных даты и времени в часовом поясе timezone (по умолчанию TIMEZONE).
+
+    Событие без времени начинается в полночь
+    """
+    local_dt = datetime.strptime(f"{date} {time or '00:00'}", "%Y-%m-%d %H:%M")
+    return int(pytz.timezone(timezone or TIMEZONE).localize(local_dt).timestamp())
+
+def reminder_schedule(starts_at: int) -> list:
+    """Напоминания для события: [(kind, due_at)] за REMINDER_OFFSETS до начала"""
+    return [(kind, starts_at - offset) for kind, offset in REMINDER_OFFSETS]
+
+def _set_event_start(conn, event_id: int, **fields) -> tuple:
+    """Меняет дату и/или время события вместе со starts_at и пересчитывает напоминания.
+
+    Вызывается после BEGIN IMMEDIATE: иначе транзакция начнется только с UPDATE,
+    и параллельное изменение даты и времени одного события потеряет одно из них.
+    Возвращает (прежняя дата, новая дата), None - события нет
+    """
+    row = conn.execute('SELECT date, time, timezone FROM events WHERE id = ?', (event_id,)).fetchone()
+    if row is None:
+        return None
+    event = {'date': row[0], 'time': row[1], **fields}
+    conn.execute('UPDATE events SET date = ?, time = ?, starts_at = ? WHERE id = ?', (
+        event['date'], event['time'], local_timestamp(event['date'], event['time'], row[2]), event_id))
+    conn.execute('DELETE FROM notification_outbox WHERE event_id = ?', (event_id,))
+    _enqueue_reminders(conn, event_id)
+    return row[0], event['date']
+
+def _enqueue_reminders(conn, event_id: int, user_ids=None):
+    """Ставит в очередь будущие напоминания участникам события (или только user_ids)"""
+    row = conn.execute('SELECT starts_at FROM events WHERE id = ?', (event_id,)).fetchone()
+    if row and row[0] is not None:
+        _insert_reminders(conn, event_id, row[0], user_ids)
+
+def _insert_reminders(conn, event_id: int, starts_at: int, user_ids=None):
+    if user_ids is None:
+        user_ids = [row[0] for row in conn.execute(
+            'SELECT user_id FROM participants WHERE event_id = ?', (event_id,))]
+    now = int(datetime.now().timestamp())
+    conn.executemany('''
+        INSERT OR IGNORE INTO notification_outbox (event_id, user_id, kind, due_at)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (event_id, user_id, kind, due_at)
+        for kind, due_at in reminder_schedule(starts_at) if due_at > now
+        for user_id in user_ids
+    ])
+
+def user_name_key(first_name: str, last_name: str, username: str) -> str:
+    """Ключ сортировки и поиска пользователей: отображаемое имя без учета регистра"""
+    return (' '.join(filter(None, (first_name, last_name))) or username or '').casefold()
+
+def username_key(username: str) -> str:
+    return (username or '').casefold()
+
+def fts_query(text: str) -> str:
+    """Пользовательский ввод -> запрос FTS5: все слова, каждое как префикс.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 во вводе не интерпретируются
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+class MembershipResult(NamedTuple):
+    """Результат записи на событие или отмены записи"""
+    # 'joined', 'left', 'already_joined', 'not_joined', 'full', 'not_found'
+    status: str
+    date: str = None
+    # Сколько событий на эту дату (для выбора экрана после обновления)
+    events_on_date: int = 0
+
+class EventDetails(NamedTuple):
+    """Модель карточки события"""
+    id: int
+    name: str
+    date: str
+    time: str
+    description: str
+    max_participants: int
+    participant_count: int
+    is_registered: bool
+    is_admin: bool
+    # (username, first_name, phone) - только для администраторов
+    participants: list = None
+
+class StorageStats(NamedTuple):
+    """Размер основной БД в страницах"""
+    page_size: int
+    page_count: int
+    freelist_count: int
+    # 0 - NONE, 1 - FULL, 2 - INCREMENTAL
+    auto_vacuum: int
+
+    @property
+    def size(self) -> int:
+        return self.page_size * self.page_count
+
+    @property
+    def free(self) -> int:
+        return self.page_size * self.freelist_count
+
+def month_bounds(year: int, month: int) -> tuple:
+    """Полуоткрытый диапазон дат месяца ['YYYY-MM-01', начало следующего месяца)"""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year}-{month:02}-01", f"{next_year}-{next_month:02}-01"
+
+def get_connection() -> sqlite3.Connection:
+    """Долгоживущее соединение текущего потока"""
+    return pool.connection()
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с БД в пуле потоков БД"""
+    loop = asyncio.get_running_loop()
+    # Контекст логов (update_id, user_id) переносится в поток БД
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pool.executor, functools.partial(context.run, func, *args, **kwargs))
 
 class DatabaseHandler:
     @staticmethod
     def init_db():
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
     
             # Таблица пользователей
@@ -63,24 +254,29 @@ class DatabaseHandler:
                         VALUES (?)
                     ''', (admin_id,))
                     conn.commit()
-                    logger.info(f"Администратор {admin_id} добавлен через переменную окружения")
+                    logger.info("Администратор %s добавлен через переменную окружения", admin_id)
                 except ValueError:
                     logger.error("Неверный формат ADMIN_ID в переменных окружения")
-            
-            # Индексы
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_date ON events(date)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_participants_event_id ON participants(event_id)')
             conn.commit()
+
+        DatabaseHandler.migrate()
+
+    @staticmethod
+    def migrate():
+        """Применяет миграции схемы, которые еще не были применены"""
+        # migrations использует функции этого модуля, поэтому импорт здесь
+        from migrations import migrate
+        migrate(get_connection())
     
     @staticmethod
     def get_user_phone(user_id: int) -> str:
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             result = conn.execute('SELECT phone FROM user_contacts WHERE user_id = ?', (user_id,)).fetchone()
             return result[0] if result else None
 
     @staticmethod
     def update_contact(user_id: int, phone: str):
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             conn.execute('''
                 INSERT OR REPLACE INTO user_contacts
                 VALUES (?, ?)
@@ -89,60 +285,78 @@ class DatabaseHandler:
 
     @staticmethod
     def is_admin(user_id: int) -> bool:
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT 1 FROM admins WHERE user_id = ?', (user_id,))
             return cursor.fetchone() is not None
 
     @staticmethod
     def update_user_info(user: dict):
-        with sqlite3.connect(DB_NAME) as conn:
+        first_name = user.get('first_name', '')
+        last_name = user.get('last_name', '')
+        username = user.get('username', '')
+        with get_connection() as conn:
             conn.execute('''
-                INSERT OR REPLACE INTO users
-                VALUES (?, ?, ?, ?)
+                INSERT OR REPLACE INTO users (user_id, first_name, last_name, username, name_key, username_key)
+                VALUES (?, ?, ?, ?, ?, ?)
             ''', (
                 user['id'],
-                user.get('first_name', ''),
-                user.get('last_name', ''),
-                user.get('username', '')
+                first_name,
+                last_name,
+                username,
+                user_name_key(first_name, last_name, username),
+                username_key(username)
             ))
             conn.commit()
     @staticmethod
     def get_event_dates(year: int, month: int) -> list:
         """Возвращает список дат с событиями в формате 'YYYY-MM-DD' для указанного месяца"""
-        month_str = f"{year}-{month:02}"
-        with sqlite3.connect(DB_NAME) as conn:
+        start, end = month_bounds(year, month)
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT DISTINCT date 
                 FROM events 
-                WHERE strftime('%Y-%m', date) = ?
-            ''', (month_str,))
+                WHERE date >= ? AND date < ?
+            ''', (start, end))
             return [row[0] for row in cursor.fetchall()]
     @staticmethod
     def get_user_event_dates(user_id: int, year: int, month: int) -> list:
         """Возвращает даты с событиями пользователя в формате 'YYYY-MM-DD'"""
-        month_str = f"{year}-{month:02}"
-        with sqlite3.connect(DB_NAME) as conn:
+        start, end = month_bounds(year, month)
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT DISTINCT e.date
                 FROM events e
                 JOIN participants p ON e.id = p.event_id
                 WHERE p.user_id = ? 
-                AND strftime('%Y-%m', e.date) = ?
-            ''', (user_id, month_str))
+                AND e.date >= ? AND e.date < ?
+            ''', (user_id, start, end))
             return [row[0] for row in cursor.fetchall()]
     @staticmethod
     def get_admins():
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT user_id FROM admins')
             return [row[0] for row in cursor.fetchall()]
 
+    @staticmethod
+    def get_admins_version() -> int:
+        with get_connection() as conn:
+            return _admins_version(conn)
+
+    @staticmethod
+    def get_admins_snapshot() -> tuple:
+        """Версия и множество администраторов, прочитанные согласованно"""
+        with get_connection() as conn:
+            conn.execute('BEGIN')
+            admins = frozenset(row[0] for row in conn.execute('SELECT user_id FROM admins'))
+            return _admins_version(conn), admins
+
     @staticmethod
     def get_admins_with_info():
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT a.user_id, u.first_name, u.last_name, u.username 
@@ -151,16 +365,510 @@ class DatabaseHandler:
             ''')
             return cursor.fetchall()
     @staticmethod
-    def get_all_users():
-        """Получить всех зарегистрированных пользователей"""
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT user_id, first_name, last_name, username 
+    def get_user(user_id: int):
+        with get_connection() as conn:
+            return conn.execute(
+                'SELECT user_id, first_name, last_name, username FROM users WHERE user_id = ?',
+                (user_id,)
+            ).fetchone()
+
+    @staticmethod
+    def get_users_page(limit: int, after_user_id: int = None, prefix: str = None) -> list:
+        """Страница пользователей в порядке имени, начиная после after_user_id.
+
+        Курсор - user_id последнего показанного пользователя: выборка идет по индексу
+        (name_key, user_id) и не зависит от номера страницы.
+        prefix - поиск по началу имени или username без учета регистра
+        """
+        if prefix:
+            return DatabaseHandler._search_users_page(limit, after_user_id, prefix.casefold().lstrip('@'))
+        condition, params = '', ()
+        if after_user_id is not None:
+            condition = 'WHERE (name_key, user_id) > (SELECT name_key, user_id FROM users WHERE user_id = ?)'
+            params = (after_user_id,)
+        with get_connection() as conn:
+            return conn.execute(f'''
+                SELECT user_id, first_name, last_name, username
                 FROM users
-                ORDER BY first_name, last_name
-            ''')
-            return cursor.fetchall()
+                {condition}
+                ORDER BY name_key, user_id
+                LIMIT ?
+            ''', (*params, limit)).fetchall()
+
+    @staticmethod
+    def _search_users_page(limit: int, after_user_id: int, start: str) -> list:
+        """Поиск по началу имени или username: два диапазона индексов, каждый не больше limit строк.
+
+        Совпавшие по имени идут по name_key, остальные совпавшие по username - по username_key;
+        общий порядок - по ключу совпадения. Курсор (ключ, user_id) - нижняя граница
+        обоих диапазонов: так глубокие страницы не просматривают индекс с начала префикса
+        """
+        end = start + '\U0010ffff'
+        with get_connection() as conn:
+            key, after = start, 0
+            if after_user_id is not None:
+                row = conn.execute(
+                    'SELECT name_key, username_key FROM users WHERE user_id = ?', (after_user_id,)).fetchone()
+                if row is None:
+                    return []
+                key, after = (row[0] if start <= row[0] < end else row[1]), after_user_id
+            return conn.execute('''
+                SELECT u.user_id, u.first_name, u.last_name, u.username
+                FROM (
+                    SELECT * FROM (
+                        SELECT name_key AS match_key, user_id FROM users
+                        WHERE (name_key, user_id) > (?, ?) AND name_key < ?
+                        ORDER BY name_key, user_id
+                        LIMIT ?
+                    )
+                    UNION ALL
+                    SELECT * FROM (
+                        SELECT username_key, user_id FROM users
+                        WHERE (username_key, user_id) > (?, ?) AND username_key < ?
+                        AND NOT (name_key >= ? AND name_key < ?)
+                        ORDER BY username_key, user_id
+                        LIMIT ?
+                    )
+                ) m
+                JOIN users u ON u.user_id = m.user_id
+                ORDER BY m.match_key, m.user_id
+                LIMIT ?
+            ''', (key, after, end, limit, key, after, end, start, end, limit, limit)).fetchall()
+
+    @staticmethod
+    def get_calendar_dates(year: int, month: int, user_id: int = None) -> tuple:
+        """Даты с событиями и даты с участием пользователя за месяц"""
+        event_dates = set(DatabaseHandler.get_event_dates(year, month))
+        user_event_dates = set()
+        if user_id:
+            user_event_dates = set(DatabaseHandler.get_user_event_dates(user_id, year, month))
+        return event_dates, user_event_dates
+
+    @staticmethod
+    def get_events_for_date(date: str) -> list:
+        """События на дату: (id, time, name), отсортированные по времени.
+
+        Отбор по date, как и в календаре: starts_at посчитан в часовом поясе
+        события и может быть NULL (время не разобралось) - такие события в конце
+        """
+        with get_connection() as conn:
+            return conn.execute('''
+                SELECT id, time, name
+                FROM events
+                WHERE date = ?
+                ORDER BY starts_at IS NULL, starts_at, time
+            ''', (date,)).fetchall()
+
+    @staticmethod
+    def get_user_events_page(user_id: int, limit: int, after: tuple = None, before: tuple = None) -> list:
+        """Предстоящие события пользователя в порядке начала: (id, name, date, time, starts_at).
+
+        after/before - курсор (starts_at, id) последнего или первого события
+        соседней страницы. Выборка - диапазон индекса (user_id, starts_at, event_id)
+        от курсора, без OFFSET и сортировки всех записей пользователя
+        """
+        today = local_timestamp(datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d"))
+        if before is not None:
+            condition, order = 'AND (p.starts_at, p.event_id) < (?, ?)', 'DESC'
+            params = before
+        elif after is not None:
+            condition, order = 'AND (p.starts_at, p.event_id) > (?, ?)', 'ASC'
+            params = after
+        else:
+            condition, order, params = '', 'ASC', ()
+        with get_connection() as conn:
+            rows = conn.execute(f'''
+                SELECT e.id, e.name, e.date, e.time, p.starts_at
+                FROM participants p
+                JOIN events e ON e.id = p.event_id
+                WHERE p.user_id = ? AND p.starts_at >= ? {condition}
+                ORDER BY p.starts_at {order}, p.event_id {order}
+                LIMIT ?
+            ''', (user_id, today, *params, limit)).fetchall()
+        return rows[::-1] if before is not None else rows
+
+    @staticmethod
+    def search_events(text: str, limit: int, offset: int = 0) -> list:
+        """Предстоящие события по словам из названия или описания.
+
+        Сортировка по релевантности (совпадение в названии весит больше), затем по дате
+        """
+        match = fts_query(text)
+        if not match:
+            return []
+        today = datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d")
+        with get_connection() as conn:
+            return conn.execute('''
+                SELECT e.id, e.name, e.date, e.time, e.description
+                FROM events_fts
+                JOIN events e ON e.id = events_fts.rowid
+                WHERE events_fts MATCH ? AND e.date >= ?
+                ORDER BY bm25(events_fts, 10.0, 1.0), e.date, e.time, e.id
+                LIMIT ? OFFSET ?
+            ''', (match, today, limit, offset)).fetchall()
+
+    @staticmethod
+    def get_event_details(event_id: int, user_id: int, is_admin: bool = False):
+        """Карточка события для пользователя за одно обращение к БД:
+        поля события, счетчик участников, запись пользователя,
+        а для администратора - список участников"""
+        with get_connection() as conn:
+            row = conn.execute('''
+                SELECT e.id, e.name, e.date, e.time, e.description,
+                e.max_participants, e.participant_count,
+                EXISTS(SELECT 1 FROM participants WHERE event_id = e.id AND user_id = ?)
+                FROM events e
+                WHERE e.id = ?
+            ''', (user_id, event_id)).fetchone()
+            if row is None:
+                return None
+
+            details = EventDetails(*row, is_admin)
+            if is_admin:
+                participants = conn.execute('''
+                    SELECT u.username, u.first_name, uc.phone
+                    FROM participants p
+                    JOIN users u ON p.user_id = u.user_id
+                    LEFT JOIN user_contacts uc ON p.user_id = uc.user_id
+                    WHERE p.event_id = ?
+                ''', (event_id,)).fetchall()
+                details = details._replace(participants=participants)
+            return details
+
+
+    @staticmethod
+    def recover_outbox() -> int:
+        """Возвращает в очередь напоминания, отправка которых прервалась остановкой бота"""
+        with get_connection() as conn:
+            return conn.execute('''
+                UPDATE notification_outbox
+                SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'sending'
+            ''').rowcount
+
+    @staticmethod
+    def claim_outbox_batch(now: int, limit: int, expire_before: int, lease_before: int) -> list:
+        """Забирает пачку наступивших напоминаний в отправку:
+        (id, event_id, user_id, kind, due_at, attempts, name, date, time)
+
+        Отправки, начатые раньше lease_before и так и не завершенные, возвращаются в очередь
+        """
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'sending' AND updated_at < datetime(?, 'unixepoch')
+            ''', (lease_before,))
+            # Слишком старые напоминания (бот долго не работал) уже бесполезны
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = 'expired', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'pending' AND due_at < ?
+            ''', (expire_before,))
+            ids = [row[0] for row in conn.execute('''
+                SELECT id FROM notification_outbox
+                WHERE status = 'pending' AND due_at <= ?
+                ORDER BY due_at
+                LIMIT ?
+            ''', (now, limit))]
+            if not ids:
+                return []
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(f'''
+                UPDATE notification_outbox
+                SET status = 'sending', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders})
+            ''', ids)
+            return conn.execute(f'''
+                SELECT o.id, o.event_id, o.user_id, o.kind, o.due_at, o.attempts,
+                       e.name, e.date, e.time
+                FROM notification_outbox o
+                JOIN events e ON e.id = o.event_id
+                WHERE o.id IN ({placeholders})
+                ORDER BY o.due_at
+            ''', ids).fetchall()
+
+    @staticmethod
+    def complete_outbox(outbox_id: int, status: str, error: str = None, retry_at: int = None):
+        """Фиксирует результат отправки. retry_at - вернуть в очередь на это время"""
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = ?, last_error = ?, due_at = COALESCE(?, due_at),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, error, retry_at, outbox_id))
+
+    @staticmethod
+    def get_next_reminder_due():
+        """Срок ближайшего ожидающего напоминания (по индексу status, due_at)"""
+        with get_connection() as conn:
+            return conn.execute(
+                "SELECT MIN(due_at) FROM notification_outbox WHERE status = 'pending'").fetchone()[0]
+
+    @staticmethod
+    def get_outbox_pending(now: int) -> int:
+        """Наступившие, но не отправленные напоминания.
+
+        Диапазон индекса (status, due_at) до now: будущих напоминаний может быть миллионы,
+        а считается только невыполненная работа
+        """
+        with get_connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM notification_outbox WHERE status = 'pending' AND due_at <= ?",
+                (now,)).fetchone()[0]
+
+    @staticmethod
+    def create_event(date: str, time: str, name: str, description: str,
+                     creator_id: int, max_participants: int) -> int:
+        with get_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO events (date, time, starts_at, timezone, name, description, creator_id, max_participants)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (date, time, local_timestamp(date, time), TIMEZONE, name, description, creator_id, max_participants))
+            return cursor.lastrowid
+
+    @staticmethod
+    def update_event(event_id: int, column: str, value) -> str:
+        """Обновляет одно поле события и возвращает его дату"""
+        if column not in ('name', 'description', 'time', 'date', 'max_participants'):
+            raise ValueError(f"Недопустимое поле события: {column}")
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if column in ('date', 'time'):
+                dates = _set_event_start(conn, event_id, **{column: value})
+                return dates[1] if dates else None
+            conn.execute(f'UPDATE events SET {column} = ? WHERE id = ?', (value, event_id))
+            row = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()
+            return row[0] if row else None
+
+    @staticmethod
+    def move_event(event_id: int, new_date: str) -> str:
+        """Переносит событие на другую дату и возвращает прежнюю дату"""
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            dates = _set_event_start(conn, event_id, date=new_date)
+            return dates[0] if dates else None
+
+    @staticmethod
+    def delete_event(event_id: int) -> str:
+        """Удаляет событие с участниками и возвращает его дату"""
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()
+            conn.execute('DELETE FROM notification_outbox WHERE event_id = ?', (event_id,))
+            conn.execute('DELETE FROM participants WHERE event_id = ?', (event_id,))
+            conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+            return row[0] if row else None
+
+    @staticmethod
+    def join_event(event_id: int, user_id: int) -> MembershipResult:
+        """Записывает пользователя на событие, если есть свободные места.
+
+        Проверка лимита и вставка - один условный INSERT, поэтому
+        параллельные записи не могут превысить max_participants.
+        """
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            inserted = conn.execute('''
+                INSERT OR IGNORE INTO participants (event_id, user_id)
+                SELECT id, ? FROM events
+                WHERE id = ? AND (max_participants = 0 OR participant_count < max_participants)
+            ''', (user_id, event_id)).rowcount
+            if inserted:
+                _enqueue_reminders(conn, event_id, [user_id])
+                return _membership_result(conn, 'joined', event_id)
+
+            row = conn.execute('''
+                SELECT EXISTS(SELECT 1 FROM participants WHERE event_id = ? AND user_id = ?)
+                FROM events WHERE id = ?
+            ''', (event_id, user_id, event_id)).fetchone()
+            if row is None:
+                return MembershipResult('not_found')
+            return _membership_result(conn, 'already_joined' if row[0] else 'full', event_id)
+
+    @staticmethod
+    def leave_event(event_id: int, user_id: int) -> MembershipResult:
+        with get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            deleted = conn.execute(
+                'DELETE FROM participants WHERE event_id = ? AND user_id = ?', (event_id, user_id)
+            ).rowcount
+            conn.execute('''
+                DELETE FROM notification_outbox
+                WHERE event_id = ? AND user_id = ? AND status = 'pending'
+            ''', (event_id, user_id))
+            return _membership_result(conn, 'left' if deleted else 'not_joined', event_id)
+
+    @staticmethod
+    def add_admin(user_id: int) -> int:
+        """Добавляет администратора и возвращает новую версию списка"""
+        with get_connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO admins (user_id) VALUES (?)', (user_id,))
+            return _admins_version(conn)
+
+    @staticmethod
+    def remove_admin(user_id: int) -> int:
+        """Удаляет администратора и возвращает новую версию списка"""
+        with get_connection() as conn:
+            conn.execute('DELETE FROM admins WHERE user_id = ?', (user_id,))
+            return _admins_version(conn)
+
+    @staticmethod
+    def archive_events(before: int, limit: int) -> tuple:
+        """Переносит в архивную БД до limit событий, начавшихся раньше before, с участниками.
+
+        Копирование и удаление - отдельные транзакции: в WAL транзакция над двумя
+        файлами не атомарна, а при сбое между ними копирование просто повторится.
+        Возвращает ([(id, date)] перенесенных событий, число записей участников)
+        """
+        conn = get_connection()
+        _attach_archive(conn)
+        with conn:
+            # Чтение основной БД не мешает записи бота, блокируется только архив
+            conn.execute('BEGIN')
+            events = conn.execute('''
+                SELECT id, date FROM events
+                WHERE starts_at < ?
+                ORDER BY starts_at
+                LIMIT ?
+            ''', (before, limit)).fetchall()
+            if not events:
+                return [], 0
+            ids = [row[0] for row in events]
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(f'''
+                INSERT OR REPLACE INTO archive.events ({ARCHIVED_EVENT_COLUMNS})
+                SELECT {ARCHIVED_EVENT_COLUMNS} FROM events WHERE id IN ({placeholders})
+            ''', ids)
+            conn.execute(f'''
+                INSERT OR IGNORE INTO archive.participants (event_id, user_id)
+                SELECT event_id, user_id FROM participants WHERE event_id IN ({placeholders})
+            ''', ids)
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            # Сначала события: триггер счетчика участников не находит строку и ничего не пишет
+            conn.execute(f'DELETE FROM events WHERE id IN ({placeholders})', ids)
+            participants = conn.execute(
+                f'DELETE FROM participants WHERE event_id IN ({placeholders})', ids).rowcount
+            conn.execute(f'DELETE FROM notification_outbox WHERE event_id IN ({placeholders})', ids)
+        return events, participants
+
+    @staticmethod
+    def purge_outbox(before: int, limit: int) -> int:
+        """Удаляет до limit завершенных напоминаний со сроком раньше before"""
+        with get_connection() as conn:
+            return conn.execute('''
+                DELETE FROM notification_outbox WHERE id IN (
+                    SELECT id FROM notification_outbox
+                    WHERE status IN ('sent', 'failed', 'expired') AND due_at < ?
+                    LIMIT ?
+                )
+            ''', (before, limit)).rowcount
+
+    @staticmethod
+    def get_storage_stats() -> StorageStats:
+        with get_connection() as conn:
+            return StorageStats(*(
+                conn.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')
+            ))
+
+    @staticmethod
+    def incremental_vacuum(pages: int) -> int:
+        """Возвращает системе до pages свободных страниц; возвращает число оставшихся"""
+        conn = get_connection()
+        # execute() делает один шаг прагмы - одну страницу, executescript выполняет ее до конца
+        conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+        return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    @staticmethod
+    def optimize():
+        with get_connection() as conn:
+            conn.execute('PRAGMA optimize')
+
+    @staticmethod
+    def vacuum():
+        """Полная пересборка файла; включает auto_vacuum=INCREMENTAL у существующей базы.
+
+        Блокирует запись на все время и требует места еще на одну копию базы
+        """
+        conn = get_connection()
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+
+ARCHIVED_EVENT_COLUMNS = (
+    'id, date, time, starts_at, timezone, name, description, creator_id, max_participants, participant_count'
+)
+
+def _attach_archive(conn):
+    """Подключает к соединению архивную БД (файл ARCHIVE_DB_NAME рядом с основной)"""
+    if conn.execute("SELECT 1 FROM pragma_database_list WHERE name = 'archive'").fetchone():
+        return
+    path = os.path.join(os.path.dirname(pool.path), ARCHIVE_DB_NAME)
+    conn.execute('ATTACH DATABASE ? AS archive', (path,))
+    conn.execute('PRAGMA archive.journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.events (
+            id INTEGER PRIMARY KEY,
+            date TEXT,
+            time TEXT,
+            starts_at INTEGER,
+            timezone TEXT,
+            name TEXT,
+            description TEXT,
+            creator_id INTEGER,
+            max_participants INTEGER,
+            participant_count INTEGER,
+            archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.participants (
+            event_id INTEGER,
+            user_id INTEGER,
+            PRIMARY KEY(event_id, user_id)
+        )
+    ''')
+
+def _admins_version(conn) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'admins_version'").fetchone()
+    return row[0] if row else 0
+
+def _membership_result(conn, status: str, event_id: int) -> MembershipResult:
+    row = conn.execute('''
+        SELECT e.date, (SELECT COUNT(*) FROM events WHERE date = e.date)
+        FROM events e WHERE e.id = ?
+    ''', (event_id,)).fetchone()
+    if row is None:
+        return MembershipResult('not_found')
+    return MembershipResult(status, *row)
+
+def _measured(method, name: str, *args, **kwargs):
+    # Замер в потоке БД: только работа с SQLite, без ожидания свободного потока
+    started = time.perf_counter()
+    try:
+        return method(*args, **kwargs)
+    finally:
+        sql_duration.observe(time.perf_counter() - started, call_site=name)
+
+class AsyncDatabaseHandler:
+    """Awaitable-обертка над DatabaseHandler: каждый метод выполняется в потоке БД"""
+    def __getattr__(self, name):
+        method = getattr(DatabaseHandler, name)
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            return await run_db(_measured, method, name, *args, **kwargs)
+
+        setattr(self, name, wrapper)
+        return wrapper
+
+db = AsyncDatabaseHandler()
 
 def init_database():
-    DatabaseHandler.init_db()
\ No newline at end of file
+    DatabaseHandler.init_db()
+
+def close_database():
+    pool.close()
\ No newline at end of file
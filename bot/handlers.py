@@ -4,22 +4,29 @@ from telegram import (
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
     InlineKeyboardButton,
-    InlineKeyboardMarkup
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent
 )
+from telegram.error import BadRequest
 from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     ContextTypes,
     filters,
     ConversationHandler
 )
-from config import DB_NAME, TIMEZONE, logger
-from database import DatabaseHandler
+from config import logger, USER_PAGE_SIZE, SEARCH_PAGE_SIZE, MY_EVENTS_PAGE_SIZE
+from database import db
+from cache import calendar_cache, event_cache, admin_cache, render_cache
+from notifications import reminder_scheduler
 from tg_calendar import Calendar
-import pytz
-import sqlite3
+from callbacks import router, encode, decode, pattern, CallbackDataError
 from datetime import datetime
+from metrics import edits_skipped, handler_duration, timed
+from log import with_handler_names
 
 # Импорт состояний из config
 from config import (
@@ -28,16 +35,51 @@ from config import (
     CONFIRM_DELETE, ADMIN_MENU, ADD_ADMIN, REMOVE_ADMIN
 )
 
+# Ответы на запись и отмену записи (статусы DatabaseHandler.join_event/leave_event)
+MEMBERSHIP_MESSAGES = {
+    'joined': "✅ Вы успешно записались!",
+    'left': "✅ Запись отменена",
+    'already_joined': "⚠️ Вы уже записаны",
+    'not_joined': "⚠️ Вы не записаны на это событие",
+    'full': "⚠️ Свободных мест нет",
+    'not_found': "Событие не найдено",
+}
+
+async def safe_edit(query, text: str, reply_markup=None, **kwargs) -> bool:
+    """Редактирует сообщение с кнопкой, только если его содержимое изменится.
+
+    Отпечаток последнего отправленного вида хранится в render_cache, поэтому
+    повторная отрисовка того же экрана не тратит запрос к Telegram и лимит
+    """
+    message = query.message
+    fingerprint = render_cache.fingerprint(text, reply_markup, kwargs)
+    if message is not None and render_cache.get(message.chat.id, message.message_id) == fingerprint:
+        edits_skipped.inc(reason='cached')
+        return False
+
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+    except BadRequest as e:
+        if "Message is not modified" not in str(e):
+            if message is not None:
+                render_cache.forget(message.chat.id, message.message_id)
+            raise
+        # Вид совпал с отправленным до перезапуска или другим процессом
+        edits_skipped.inc(reason='not_modified')
+    if message is not None:
+        render_cache.set(message.chat.id, message.message_id, fingerprint)
+    return True
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
-    DatabaseHandler.update_user_info({
+    await db.update_user_info({
         'id': user.id,
         'first_name': user.first_name,
         'last_name': user.last_name,
         'username': user.username
     })
 
-    if not DatabaseHandler.get_user_phone(user.id):
+    if not await db.get_user_phone(user.id):
         contact_button = KeyboardButton("📱 Поделиться контактом", request_contact=True)
         await update.message.reply_text(
             "Для использования бота необходимо поделиться контактом:",
@@ -56,18 +98,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def contact_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     phone = update.message.contact.phone_number
-    DatabaseHandler.update_contact(user.id, phone)
+    await db.update_contact(user.id, phone)
     await update.message.reply_text("✅ Спасибо! Теперь вы можете использовать бота.", reply_markup=ReplyKeyboardRemove())
     return await start(update, context)
 
 async def add_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    if not DatabaseHandler.is_admin(user_id):
+    if not await admin_cache.is_admin(user_id):
         await update.message.reply_text("⛔ У вас нет прав для создания событий!")
         return
 
     context.user_data['creating_event'] = {}
-    markup = Calendar.create_calendar()
+    markup = await Calendar.create_calendar()
     await update.message.reply_text("Выберите дату для события:", reply_markup=markup)
     return DATE
 
@@ -75,16 +117,18 @@ async def date_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    if query.data.startswith('nav_'):
-        year, month = map(int, query.data.split('_')[1].split('-'))
-        await query.edit_message_text(
+    callback = decode(query.data)
+    if callback.action == 'nav':
+        year, month = callback.args[0]
+        await safe_edit(
+            query,
             text="Выберите дату:",
-            reply_markup=Calendar.create_calendar(year, month))
+            reply_markup=await Calendar.create_calendar(year, month))
 
-    if query.data.startswith('view_'):
-        date = query.data.split('_')[1]
+    if callback.action == 'view':
+        date, = callback.args
         context.user_data['creating_event']['date'] = date
-        await query.edit_message_text("📝 Введите название события:")
+        await safe_edit(query, "📝 Введите название события:")
         return EVENT_NAME
 
 async def name_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -124,19 +168,16 @@ async def max_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if max_part < 0:
             raise ValueError
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.execute('''
-                INSERT INTO events (date, time, name, description, creator_id, max_participants)
-                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                context.user_data['creating_event']['date'],
-                context.user_data['creating_event'].get('time', ''),
-                context.user_data['creating_event']['name'],  # Добавлено имя
-                context.user_data['creating_event']['description'],
-                update.message.from_user.id,
-                max_part
-            ))
-            conn.commit()
+        event_date = context.user_data['creating_event']['date']
+        await db.create_event(
+            event_date,
+            context.user_data['creating_event'].get('time', ''),
+            context.user_data['creating_event']['name'],
+            context.user_data['creating_event']['description'],
+            update.message.from_user.id,
+            max_part
+        )
+        calendar_cache.invalidate_event_date(event_date)
 
         await update.message.reply_text("✅ Событие успешно создано!")
         return ConversationHandler.END
@@ -146,309 +187,254 @@ async def max_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    markup = Calendar.create_calendar(user_id=user_id)
+    markup = await Calendar.create_calendar(user_id=user_id)
     await update.message.reply_text("Выберите дату для просмотра событий:", reply_markup=markup)
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки вне диалогов: разбор callback_data и вызов обработчика по таблице маршрутов.
+
+    Обработчик может вернуть текст уведомления; на нажатие отвечаем ровно один раз, после работы
+    """
     query = update.callback_query
-    await query.answer()
-    data = query.data
-    user_id = query.from_user.id
+    try:
+        callback, handler = router.resolve(query.data)
+    except CallbackDataError as e:
+        logger.warning("Отклонены данные кнопки %r: %s", query.data, e)
+        await query.answer("⚠️ Кнопка устарела, откройте меню заново")
+        return
 
     try:
-        if data.startswith('edit_'):
-            event_id = data.split('_')[1]
-            return await start_edit_event(update, context)
-
-        elif data.startswith('delete_'):
-            event_id = data.split('_')[1]
-            return await confirm_delete_handler(update, context)
-
-        elif data.startswith('nav_'):
-            year, month = map(int, data.split('_')[1].split('-'))
-            await query.edit_message_text(
-                text="Выберите дату:",
-                reply_markup=Calendar.create_calendar(year, month, user_id)
-            )
+        notice = await router.dispatch(callback, handler, update, context)
+    except Exception as e:
+        logger.error("Ошибка обработки callback %s: %s", callback.action, e, exc_info=True)
+        notice = "⚠️ Произошла ошибка"
+    await query.answer(notice)
+
+@router.route('ignore')
+async def ignore_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    pass
+
+@router.route('nav')
+async def calendar_month(update: Update, context: ContextTypes.DEFAULT_TYPE, month: tuple):
+    year, month = month
+    await safe_edit(
+        update.callback_query,
+        text="Выберите дату:",
+        reply_markup=await Calendar.create_calendar(year, month, update.effective_user.id)
+    )
 
-        elif data.startswith('view_'):
-            date = data.split('_')[1]
-            await show_events_for_date(query, date, user_id)
+@router.route('view')
+async def calendar_date(update: Update, context: ContextTypes.DEFAULT_TYPE, date: str):
+    await show_events_for_date(update.callback_query, date, update.effective_user.id)
 
-        elif data.startswith('event_'):
-            parts = data.split('_')
-            if len(parts) == 3:
-                action, event_id = parts[1], parts[2]
-                await handle_event_action(query, event_id, action, user_id)
-            else:
-                await query.edit_message_text("Ошибка обработки запроса")
+@router.route('details')
+async def event_details(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
+    return await handle_event_action(update.callback_query, event_id, 'details', update.effective_user.id)
 
-    except Exception as e:
-        logger.error(f"Ошибка обработки callback: {e}")
-        await query.answer("⚠️ Произошла ошибка")
+@router.route('join')
+async def event_join(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
+    return await handle_event_action(update.callback_query, event_id, 'join', update.effective_user.id)
 
-async def show_events_for_date(query, date: str, user_id: int):
-    try:
-        # Парсим дату для получения года и месяца
-        selected_date = datetime.strptime(date, "%Y-%m-%d")
-        year = selected_date.year
-        month = selected_date.month
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id, time, name
-                FROM events
-                WHERE date = ?
-                ORDER BY time
-            ''', (date,))
-            events = cursor.fetchall()
-
-        if not events:
-            await query.edit_message_text(f"На {date} нет событий", reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("🔙 Назад к календарю", callback_data=f'nav_{year}-{month}')]
-                    ]))
-            return
+@router.route('leave')
+async def event_leave(update: Update, context: ContextTypes.DEFAULT_TYPE, event_id: int):
+    return await handle_event_action(update.callback_query, event_id, 'leave', update.effective_user.id)
 
-        # Если событие только одно - сразу показываем его
-        if len(events) == 1:
-            event_id, time, desc = events[0]
-            await show_single_event(query, event_id, user_id, date)
-            return
+@router.route('my_next')
+async def my_events_next(update: Update, context: ContextTypes.DEFAULT_TYPE, starts_at: int, event_id: int):
+    text, markup = await render_my_events(update.effective_user.id, 'next', (starts_at, event_id))
+    await safe_edit(update.callback_query, text, reply_markup=markup)
+
+@router.route('my_prev')
+async def my_events_prev(update: Update, context: ContextTypes.DEFAULT_TYPE, starts_at: int, event_id: int):
+    text, markup = await render_my_events(update.effective_user.id, 'prev', (starts_at, event_id))
+    await safe_edit(update.callback_query, text, reply_markup=markup)
+
+@router.route('search')
+async def search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, offset: int):
+    query = update.callback_query
+    search = context.user_data.get('search_query')
+    if not search:
+        await safe_edit(query, "Повторите поиск командой /search")
+        return
+    text, markup = await render_search_results(search, offset)
+    await safe_edit(query, text, reply_markup=markup)
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <слова> - поиск предстоящих событий по названию и описанию"""
+    search = ' '.join(context.args)
+    if not search:
+        await update.message.reply_text("🔎 Использование: /search <слова из названия или описания>")
+        return
 
-        # Если событий несколько - показываем список
-        keyboard = []
-        for eid, time, name in events:
-            btn_text = f"{time} - {name[:15]}..." if time else name[:20]
-            keyboard.append([InlineKeyboardButton(btn_text, callback_data=f'event_details_{eid}')])
+    # Запрос хранится у пользователя: в callback_data помещается только смещение
+    context.user_data['search_query'] = search
+    text, markup = await render_search_results(search, 0)
+    await update.message.reply_text(text, reply_markup=markup)
 
-        keyboard.append([InlineKeyboardButton("🔙 Назад к календарю", callback_data=f'nav_{year}-{month}')])
+async def render_search_results(search: str, offset: int):
+    events = await db.search_events(search, SEARCH_PAGE_SIZE + 1, offset)
+    has_next = len(events) > SEARCH_PAGE_SIZE
+    events = events[:SEARCH_PAGE_SIZE]
+    if not events:
+        return f"По запросу «{search}» ничего не найдено", None
 
-        try:
-            await query.edit_message_text(
-                text=f"📅 События на {date}:",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+    keyboard = []
+    for eid, name, date, time, _ in events:
+        btn_text = f"{date} {time} - {name[:30]}" if time else f"{date} - {name[:30]}"
+        keyboard.append([InlineKeyboardButton(btn_text, callback_data=encode('details', eid))])
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=encode('search', max(0, offset - SEARCH_PAGE_SIZE))))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=encode('search', offset + SEARCH_PAGE_SIZE)))
+    if navigation:
+        keyboard.append(navigation)
+    return f"🔎 События по запросу «{search}»:", InlineKeyboardMarkup(keyboard)
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-режим: @бот <слова> в любом чате"""
+    inline_query = update.inline_query
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    events = await db.search_events(inline_query.query, SEARCH_PAGE_SIZE, offset)
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(eid),
+            title=name,
+            description=f"📅 {date} ⏰ {time or 'Не указано'}",
+            input_message_content=InputTextMessageContent(
+                f"🏷 {name}\n📅 {date}\n⏰ {time or 'Не указано'}\n📄 {description}"
             )
-        except Exception as e:
-            if "Message is not modified" in str(e):
-                await query.answer()
-            else:
-                raise
+        )
+        for eid, name, date, time, description in events
+    ]
+    next_offset = str(offset + SEARCH_PAGE_SIZE) if len(events) == SEARCH_PAGE_SIZE else ''
+    await inline_query.answer(results, cache_time=30, next_offset=next_offset)
 
-    except Exception as e:
-        logger.error(f"Ошибка показа событий: {e}")
-        await query.answer("⚠️ Произошла ошибка")
+@timed(handler_duration, handler='show_events_for_date')
+async def show_events_for_date(query, date: str, user_id: int):
+    # Парсим дату для получения года и месяца
+    selected_date = datetime.strptime(date, "%Y-%m-%d")
+    year = selected_date.year
+    month = selected_date.month
+    events = await db.get_events_for_date(date)
+
+    if not events:
+        await safe_edit(query, f"На {date} нет событий", reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("🔙 Назад к календарю", callback_data=encode('nav', (year, month)))]
+                ]))
+        return
 
-async def show_single_event(query, event_id: int, user_id: int, date: str):
-    try:
-        # Парсим дату для получения года и месяца
-        selected_date = datetime.strptime(date, "%Y-%m-%d")
-        year = selected_date.year
-        month = selected_date.month
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT e.name, e.date, e.time, e.description,
-                e.max_participants, COUNT(p.user_id),
-                EXISTS(SELECT 1 FROM participants WHERE event_id = e.id AND user_id = ?)
-                FROM events e
-                LEFT JOIN participants p ON e.id = p.event_id
-                WHERE e.id = ?
-                GROUP BY e.id
-            ''', (user_id, event_id))
-            event_data = cursor.fetchone()
-
-            if not event_data:
-                await query.edit_message_text("Событие не найдено")
-                return
-
-            name, date, time, desc, max_part, participants_count, is_registered = event_data
-            participants_text = ""
-
-            if DatabaseHandler.is_admin(user_id):
-                participants = conn.execute('''
-                    SELECT u.username, u.first_name, uc.phone
-                    FROM participants p
-                    JOIN users u ON p.user_id = u.user_id
-                    LEFT JOIN user_contacts uc ON p.user_id = uc.user_id
-                    WHERE p.event_id = ?
-                ''', (event_id,)).fetchall()
-                participants_text = "\n👥 Участники:\n" + "\n".join(
-                    f"• @{un} ({ph})" if un and ph else
-                    f"• {fn} ({ph})" if ph else
-                    f"• @{un}" if un else f"• {fn}"
-                    for un, fn, ph in participants
-                )
-            else:
-                if max_part > 0:
-                    participants_text = f"\n👥 Записано: {participants_count}/{max_part}"
-                else:
-                    participants_text = f"\n👥 Записано: {participants_count}"
-
-            text = f"""
-🏷 Название: {name}
-📅 Дата: {date}
-⏰ Время: {time or 'Не указано'}
-📄 Описание: {desc}
-{participants_text}
-            """.strip()
-
-            keyboard = []
-            if is_registered:
-                keyboard.append([InlineKeyboardButton("❌ Отменить запись", callback_data=f'event_leave_{event_id}')])
-            else:
-                if max_part == 0 or participants_count < max_part:
-                    keyboard.append([InlineKeyboardButton("✅ Записаться", callback_data=f'event_join_{event_id}')])
-
-            if DatabaseHandler.is_admin(user_id):
-                keyboard.append([
-                    InlineKeyboardButton("✏️ Редактировать", callback_data=f'edit_{event_id}'),
-                    InlineKeyboardButton("🗑 Удалить", callback_data=f'delete_{event_id}')
-                ])
-
-            keyboard.append([InlineKeyboardButton("🔙 Назад к календарю", callback_data=f'nav_{year}-{month}')])
-
-            try:
-                await query.edit_message_text(
-                    text=text,
-                    reply_markup=InlineKeyboardMarkup(keyboard))
-            except Exception as e:
-                if "Message is not modified" in str(e):
-                    await query.answer()
-                else:
-                    raise
+    # Если событие только одно - сразу показываем его
+    if len(events) == 1:
+        event_id, time, desc = events[0]
+        await show_single_event(query, event_id, user_id, date)
+        return
 
-    except Exception as e:
-        logger.error(f"Ошибка показа события: {e}")
-        await query.answer("⚠️ Произошла ошибка")
+    # Если событий несколько - показываем список
+    keyboard = []
+    for eid, time, name in events:
+        btn_text = f"{time} - {name[:15]}..." if time else name[:20]
+        keyboard.append([InlineKeyboardButton(btn_text, callback_data=encode('details', eid))])
+
+    keyboard.append([InlineKeyboardButton("🔙 Назад к календарю", callback_data=encode('nav', (year, month)))])
+
+    await safe_edit(query, f"📅 События на {date}:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+def render_event_card(details, back_button: InlineKeyboardButton):
+    """Текст и клавиатура карточки события"""
+    if details.is_admin:
+        participants_text = "\n👥 Участники:\n" + "\n".join(
+            f"• @{un} ({ph})" if un and ph else
+            f"• {fn} ({ph})" if ph else
+            f"• @{un}" if un else f"• {fn}"
+            for un, fn, ph in details.participants
+        )
+    elif details.max_participants > 0:
+        participants_text = f"\n👥 Записано: {details.participant_count}/{details.max_participants}"
+    else:
+        participants_text = f"\n👥 Записано: {details.participant_count}"
 
-async def handle_event_action(query, event_id: int, action: str, user_id: int):
-    try:
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-
-            if action == 'details':
-                cursor.execute('''
-                    SELECT e.name, e.date, e.time, e.description,
-                    e.max_participants, COUNT(p.user_id),
-                    EXISTS(SELECT 1 FROM participants WHERE event_id = e.id AND user_id = ?)
-                    FROM events e
-                    LEFT JOIN participants p ON e.id = p.event_id
-                    WHERE e.id = ?
-                    GROUP BY e.id
-                ''', (user_id, event_id))
-                event_data = cursor.fetchone()
-
-                if not event_data:
-                    await query.edit_message_text("Событие не найдено")
-                    return
-
-                name, date, time, desc, max_part, participants_count, is_registered = event_data
-                participants_text = ""
-
-                if DatabaseHandler.is_admin(user_id):
-                    participants = conn.execute('''
-                        SELECT u.username, u.first_name, uc.phone
-                        FROM participants p
-                        JOIN users u ON p.user_id = u.user_id
-                        LEFT JOIN user_contacts uc ON p.user_id = uc.user_id
-                        WHERE p.event_id = ?
-                    ''', (event_id,)).fetchall()
-                    participants_text = "\n👥 Участники:\n" + "\n".join(
-                        f"• @{un} ({ph})" if un and ph else
-                        f"• {fn} ({ph})" if ph else
-                        f"• @{un}" if un else f"• {fn}"
-                        for un, fn, ph in participants
-                    )
-                else:
-                    if max_part > 0:
-                        participants_text = f"\n👥 Записано: {participants_count}/{max_part}"
-                    else:
-                        participants_text = f"\n👥 Записано: {participants_count}"
-
-                text = f"""
-🏷 Название: {name}
-📅 Дата: {date}
-⏰ Время: {time or 'Не указано'}
-📄 Описание: {desc}
+    text = f"""
+🏷 Название: {details.name}
+📅 Дата: {details.date}
+⏰ Время: {details.time or 'Не указано'}
+📄 Описание: {details.description}
 {participants_text}
-                """.strip()
+    """.strip()
 
-                keyboard = []
-                if is_registered:
-                    keyboard.append([InlineKeyboardButton("❌ Отменить запись", callback_data=f'event_leave_{event_id}')])
-                else:
-                    if max_part == 0 or participants_count < max_part:
-                        keyboard.append([InlineKeyboardButton("✅ Записаться", callback_data=f'event_join_{event_id}')])
+    keyboard = []
+    if details.is_registered:
+        keyboard.append([InlineKeyboardButton("❌ Отменить запись", callback_data=encode('leave', details.id))])
+    elif details.max_participants == 0 or details.participant_count < details.max_participants:
+        keyboard.append([InlineKeyboardButton("✅ Записаться", callback_data=encode('join', details.id))])
+
+    if details.is_admin:
+        keyboard.append([
+            InlineKeyboardButton("✏️ Редактировать", callback_data=encode('edit', details.id)),
+            InlineKeyboardButton("🗑 Удалить", callback_data=encode('delete', details.id))
+        ])
 
-                if DatabaseHandler.is_admin(user_id):
-                    keyboard.append([
-                        InlineKeyboardButton("✏️ Редактировать", callback_data=f'edit_{event_id}'),
-                        InlineKeyboardButton("🗑 Удалить", callback_data=f'delete_{event_id}')
-                    ])
+    keyboard.append([back_button])
+    return text, InlineKeyboardMarkup(keyboard)
 
-                keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=f'view_{date}')])
+@timed(handler_duration, handler='show_single_event')
+async def show_single_event(query, event_id: int, user_id: int, date: str):
+    details = await event_cache.get(event_id, user_id)
 
-                await query.edit_message_text(
-                    text=text,
-                    reply_markup=InlineKeyboardMarkup(keyboard))
+    if not details:
+        await safe_edit(query, "Событие не найдено")
+        return
 
-            elif action in ('join', 'leave'):
-                cursor.execute('''
-                    SELECT max_participants, COUNT(p.user_id)
-                    FROM events e
-                    LEFT JOIN participants p ON e.id = p.event_id
-                    WHERE e.id = ?
-                ''', (event_id,))
-                max_part, current = cursor.fetchone()
-                cursor.execute('''
-                    SELECT e.name, e.date, e.time, e.description,
-                    e.max_participants, COUNT(p.user_id),
-                    EXISTS(SELECT 1 FROM participants WHERE event_id = e.id AND user_id = ?)
-                    FROM events e
-                    LEFT JOIN participants p ON e.id = p.event_id
-                    WHERE e.id = ?
-                    GROUP BY e.id
-                ''', (user_id, event_id))
-                event_data = cursor.fetchone()
-                name, date, time, desc, max_part, participants_count, is_registered = event_data
-                with sqlite3.connect(DB_NAME) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        SELECT id, time, name
-                        FROM events
-                        WHERE date = ?
-                        ORDER BY time
-                ''', (date,))
-                events = cursor.fetchall()
-
-                if action == 'join':
-                    try:
-                        cursor.execute('INSERT INTO participants VALUES (?, ?)', (event_id, user_id))
-                        conn.commit()
-                        await query.answer("✅ Вы успешно записались!")
-                    except sqlite3.IntegrityError:
-                        await query.answer("⚠️ Вы уже записаны")
-
-                elif action == 'leave':
-                    cursor.execute('DELETE FROM participants WHERE event_id = ? AND user_id = ?', (event_id, user_id))
-                    conn.commit()
-                    await query.answer("✅ Запись отменена")
-
-                if len(events) == 1:
-                    event_id, time, desc = events[0]
-                    await show_single_event(query, event_id, user_id, date)
-                    return
-                # Обновляем информацию о событии
-                await handle_event_action(query, event_id, 'details', user_id)
+    # Единственное событие на дату - возвращаемся сразу к календарю
+    selected_date = datetime.strptime(details.date, "%Y-%m-%d")
+    text, markup = render_event_card(details, InlineKeyboardButton(
+        "🔙 Назад к календарю", callback_data=encode('nav', (selected_date.year, selected_date.month))))
+    await safe_edit(query, text, reply_markup=markup)
 
-    except Exception as e:
-        logger.error(f"Ошибка обработки события: {e}")
-        await query.answer("⚠️ Произошла ошибка")
+async def handle_event_action(query, event_id: int, action: str, user_id: int):
+    """Карточка события, запись или отмена записи. Возвращает текст ответа на нажатие"""
+    if action == 'details':
+        details = await event_cache.get(event_id, user_id)
+
+        if not details:
+            await safe_edit(query, "Событие не найдено")
+            return
+
+        text, markup = render_event_card(details, InlineKeyboardButton(
+            "🔙 Назад", callback_data=encode('view', details.date)))
+        await safe_edit(query, text, reply_markup=markup)
+
+    elif action in ('join', 'leave'):
+        # Проверка мест и запись - одна транзакция в БД
+        if action == 'join':
+            result = await db.join_event(event_id, user_id)
+        else:
+            result = await db.leave_event(event_id, user_id)
+
+        if result.status in ('joined', 'left'):
+            calendar_cache.invalidate_user_date(user_id, result.date)
+            event_cache.invalidate(event_id)
+            await reminder_scheduler.arm()
+        if result.status == 'not_found':
+            return MEMBERSHIP_MESSAGES[result.status]
+
+        if result.events_on_date == 1:
+            await show_single_event(query, event_id, user_id, result.date)
+        else:
+            # Обновляем информацию о событии
+            await handle_event_action(query, event_id, 'details', user_id)
+        return MEMBERSHIP_MESSAGES[result.status]
 
 async def start_edit_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    # Кнопку могли переслать или подделать callback_data: права проверяются здесь, а не только при показе
+    if not await admin_cache.is_admin(update.effective_user.id):
+        await query.answer("⛔ Доступ запрещён!", show_alert=True)
+        return ConversationHandler.END
     await query.answer()
-    event_id = int(query.data.split('_')[1])
+    event_id, = decode(query.data).args
 
     context.user_data['editing_event'] = {'id': event_id}
 
@@ -468,7 +454,8 @@ async def start_edit_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("Отмена", callback_data='cancel_edit')]
     ]
 
-    await query.edit_message_text(
+    await safe_edit(
+        query,
         text="✏️ Выберите что редактировать:",
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
@@ -480,27 +467,27 @@ async def edit_choice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     choice = query.data
 
     if choice == 'edit_name':
-        await query.edit_message_text("📝 Введите новое название:")
+        await safe_edit(query, "📝 Введите новое название:")
         return EDIT_NAME
     elif choice == 'edit_desc':
-        await query.edit_message_text("📄 Введите новое описание:")
+        await safe_edit(query, "📄 Введите новое описание:")
         return EDIT_DESCRIPTION
     elif choice == 'edit_time':
-        await query.edit_message_text("⏰ Введите новое время (ЧЧ:ММ):")
+        await safe_edit(query, "⏰ Введите новое время (ЧЧ:ММ):")
         return EDIT_TIME
     elif choice == 'edit_date':
-        await query.edit_message_text("📅 Выберите новую дату:",
-                                    reply_markup=Calendar.create_calendar())
+        await safe_edit(query, "📅 Выберите новую дату:",
+                        reply_markup=await Calendar.create_calendar())
         return EDIT_DATE
     elif choice == 'edit_max':
-        await query.edit_message_text("👥 Введите новое макс. количество участников:")
+        await safe_edit(query, "👥 Введите новое макс. количество участников:")
         return EDIT_MAX
     elif choice == 'delete_event':
-        await query.edit_message_text("❌ Вы уверены что хотите удалить событие?",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("Да", callback_data='confirm_delete'),
-                                         InlineKeyboardButton("Нет", callback_data='cancel_edit')]
-                                    ]))
+        await safe_edit(query, "❌ Вы уверены что хотите удалить событие?",
+                        reply_markup=InlineKeyboardMarkup([
+                            [InlineKeyboardButton("Да", callback_data='confirm_delete'),
+                             InlineKeyboardButton("Нет", callback_data='cancel_edit')]
+                        ]))
         return CONFIRM_DELETE
     elif choice == 'cancel_edit':
         return await cancel_edit(update, context)
@@ -509,14 +496,11 @@ async def edit_name_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_name = update.message.text.strip()
     event_id = context.user_data['editing_event']['id']
     
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute('UPDATE events SET name = ? WHERE id = ?', (new_name, event_id))
-        conn.commit()
-    with sqlite3.connect(DB_NAME) as conn:
-        event_date = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()[0]
+    event_date = await db.update_event(event_id, 'name', new_name)
+    event_cache.invalidate(event_id)
     
     keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔙 К событию", callback_data=f'view_{event_date}')]
+        [InlineKeyboardButton("🔙 К событию", callback_data=encode('view', event_date))]
     ])    
     await update.message.reply_text("✅ Название обновлено!", reply_markup=keyboard)
     return ConversationHandler.END
@@ -525,14 +509,11 @@ async def edit_description_handler(update: Update, context: ContextTypes.DEFAULT
     new_desc = update.message.text.strip()
     event_id = context.user_data['editing_event']['id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute('UPDATE events SET description = ? WHERE id = ?', (new_desc, event_id))
-        conn.commit()
-    with sqlite3.connect(DB_NAME) as conn:
-        event_date = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()[0]
+    event_date = await db.update_event(event_id, 'description', new_desc)
+    event_cache.invalidate(event_id)
     
     keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔙 К событию", callback_data=f'view_{event_date}')]
+        [InlineKeyboardButton("🔙 К событию", callback_data=encode('view', event_date))]
     ])
     await update.message.reply_text("✅ Описание обновлено!", reply_markup=keyboard)
     return ConversationHandler.END
@@ -543,14 +524,12 @@ async def edit_time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         datetime.strptime(time_str, "%H:%M")
         event_id = context.user_data['editing_event']['id']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.execute('UPDATE events SET time = ? WHERE id = ?', (time_str, event_id))
-            conn.commit()
-        with sqlite3.connect(DB_NAME) as conn:
-            event_date = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()[0]
+        event_date = await db.update_event(event_id, 'time', time_str)
+        event_cache.invalidate(event_id)
+        await reminder_scheduler.arm()
 
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 К событию", callback_data=f'view_{event_date}')]
+            [InlineKeyboardButton("🔙 К событию", callback_data=encode('view', event_date))]
         ])
         await update.message.reply_text("✅ Время обновлено!",reply_markup=keyboard)
         return ConversationHandler.END
@@ -562,26 +541,28 @@ async def edit_date_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    if query.data.startswith('view_'):
-        new_date = query.data.split('_')[1]
+    callback = decode(query.data)
+    if callback.action == 'view':
+        new_date, = callback.args
         event_id = context.user_data['editing_event']['id']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.execute('UPDATE events SET date = ? WHERE id = ?', (new_date, event_id))
-            conn.commit()
-        with sqlite3.connect(DB_NAME) as conn:
-            event_date = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()[0]
+        old_date = await db.move_event(event_id, new_date)
+        event_cache.invalidate(event_id)
+        if old_date:
+            calendar_cache.invalidate_event_date(old_date, with_participants=True)
+        calendar_cache.invalidate_event_date(new_date, with_participants=True)
+        await reminder_scheduler.arm()
 
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 К событию", callback_data=f'view_{event_date}')]
+            [InlineKeyboardButton("🔙 К событию", callback_data=encode('view', new_date))]
         ])
-        await query.edit_message_text("✅ Дата обновлена!", reply_markup=keyboard)
+        await safe_edit(query, "✅ Дата обновлена!", reply_markup=keyboard)
         
         return ConversationHandler.END
 
-    elif query.data.startswith('nav_'):
-        year, month = map(int, query.data.split('_')[1].split('-'))
-        await query.edit_message_reply_markup(Calendar.create_calendar(year, month))
+    elif callback.action == 'nav':
+        year, month = callback.args[0]
+        await safe_edit(query, "📅 Выберите новую дату:", reply_markup=await Calendar.create_calendar(year, month))
         return EDIT_DATE
 
 async def edit_max_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -592,14 +573,11 @@ async def edit_max_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         event_id = context.user_data['editing_event']['id']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.execute('UPDATE events SET max_participants = ? WHERE id = ?', (max_part, event_id))
-            conn.commit()
-        with sqlite3.connect(DB_NAME) as conn:
-            event_date = conn.execute('SELECT date FROM events WHERE id = ?', (event_id,)).fetchone()[0]
+        event_date = await db.update_event(event_id, 'max_participants', max_part)
+        event_cache.invalidate(event_id)
 
         keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 К событию", callback_data=f'view_{event_date}')]
+            [InlineKeyboardButton("🔙 К событию", callback_data=encode('view', event_date))]
         ])
         await update.message.reply_text("✅ Лимит участников обновлен!", reply_markup=keyboard)
 
@@ -615,46 +593,34 @@ async def confirm_delete_handler(update: Update, context: ContextTypes.DEFAULT_T
     if query.data == 'confirm_delete':
         event_id = context.user_data['editing_event']['id']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.execute('DELETE FROM participants WHERE event_id = ?', (event_id,))
-            conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
-            conn.commit()
+        event_date = await db.delete_event(event_id)
+        event_cache.invalidate(event_id)
+        if event_date:
+            calendar_cache.invalidate_event_date(event_date, with_participants=True)
 
-        await query.edit_message_text("🗑 Событие успешно удалено!")
+        await safe_edit(query, "🗑 Событие успешно удалено!")
     else:
-        await query.edit_message_text("❌ Удаление отменено")
+        await safe_edit(query, "❌ Удаление отменено")
 
     return ConversationHandler.END
 
 async def cancel_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    await query.edit_message_text("✖️ Редактирование отменено")
+    await safe_edit(query, "✖️ Редактирование отменено")
     return ConversationHandler.END
-    
-    text = f"""
-🏷 Название: {event[1]}
-📅 Дата: {event[0]}
-⏰ Время: {event[3] or 'Не указано'}
-📄 Описание: {event[2]}
-👥 Макс. участников: {event[4] if event[4] > 0 else 'Без ограничений'}
-    """.strip()
-    
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text=text,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 Назад к событиям", callback_data=f'view_{event[0]}')]
-        ])
-    )
 
 async def delete_event_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
+    if not await admin_cache.is_admin(update.effective_user.id):
+        await query.answer("⛔ Доступ запрещён!", show_alert=True)
+        return ConversationHandler.END
     await query.answer()
-    event_id = query.data.split('_')[1]
+    event_id, = decode(query.data).args
 
-    context.user_data['deleting_event'] = event_id
-    await query.edit_message_text(
+    context.user_data['editing_event'] = {'id': event_id}
+    await safe_edit(
+        query,
         text="❌ Вы уверены что хотите удалить событие?",
         reply_markup=InlineKeyboardMarkup([
             [InlineKeyboardButton("Да", callback_data='confirm_delete'),
@@ -663,49 +629,20 @@ async def delete_event_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     return CONFIRM_DELETE
 
-async def send_event_notifications(context: ContextTypes.DEFAULT_TYPE):
-    # Получаем часовой пояс из переменной окружения
-    timezone_str = TIMEZONE
-    timezone = pytz.timezone(timezone_str)
-    
-    # Используем текущее время с учетом часового пояса
-    today = datetime.now(timezone).strftime("%Y-%m-%d")
-    
-    with sqlite3.connect(DB_NAME) as conn:
-        events = conn.execute('''
-            SELECT id, name, time
-            FROM events
-            WHERE date = ?
-        ''', (today,)).fetchall()
-
-        for event_id, name, time in events: 
-            participants = conn.execute('''
-                SELECT user_id FROM participants WHERE event_id = ?
-            ''', (event_id,)).fetchall()
-
-            for (user_id,) in participants:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text = f"⏰ Напоминание: сегодня в {time} - {name}" 
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка отправки уведомления: {e}")
-
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text("Действие отменено", reply_markup=ReplyKeyboardRemove())
     return ConversationHandler.END
 
 async def manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    if not DatabaseHandler.is_admin(user.id):
+    if not await admin_cache.is_admin(user.id):
         if update.callback_query:
             await update.callback_query.answer("⛔ Доступ запрещён!", show_alert=True)
         else:
             await update.message.reply_text("⛔ У вас нет прав доступа к этому меню!")
         return ConversationHandler.END
 
-    admins = DatabaseHandler.get_admins_with_info()
+    admins = await db.get_admins_with_info()
     text = "👑 Список администраторов:\n\n"
     
     for admin in admins:
@@ -720,48 +657,86 @@ async def manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+        await safe_edit(update.callback_query, text, reply_markup=InlineKeyboardMarkup(keyboard))
     else:
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     
     return ADMIN_MENU
 
+def user_display_name(user_id: int, first_name: str, last_name: str, username: str) -> str:
+    return ' '.join(filter(None, (first_name, last_name))) or username or f"ID: {user_id}"
+
+async def render_user_picker(context: ContextTypes.DEFAULT_TYPE):
+    """Текущая страница выбора пользователя: курсор и поиск хранятся в user_data"""
+    search = context.user_data.get('admin_search')
+    users = await db.get_users_page(USER_PAGE_SIZE + 1, context.user_data.get('admin_cursor'), search)
+    has_next = len(users) > USER_PAGE_SIZE
+    users = users[:USER_PAGE_SIZE]
+
+    # Размещаем по 2 кнопки в строке
+    keyboard = []
+    for i in range(0, len(users), 2):
+        keyboard.append([
+            InlineKeyboardButton(user_display_name(*user), callback_data=f'add_admin_{user[0]}')
+            for user in users[i:i + 2]
+        ])
+
+    navigation = []
+    if context.user_data.get('admin_pages'):
+        navigation.append(InlineKeyboardButton("◀️", callback_data='admin_users_prev'))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=f'admin_users_{users[-1][0]}'))
+    if navigation:
+        keyboard.append(navigation)
+    if search:
+        keyboard.append([InlineKeyboardButton("🔄 Сбросить поиск", callback_data='admin_add')])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_back')])
+
+    if search:
+        text = f"🔎 Пользователи по запросу «{search}»:" if users else f"По запросу «{search}» никого не найдено"
+    else:
+        text = "Выберите пользователя из списка или отправьте начало имени или username для поиска:"
+    return text, InlineKeyboardMarkup(keyboard), bool(users)
+
+def reset_user_picker(context: ContextTypes.DEFAULT_TYPE, search: str = None):
+    context.user_data['admin_search'] = search
+    context.user_data['admin_cursor'] = None
+    # Курсоры предыдущих страниц для кнопки "назад"
+    context.user_data['admin_pages'] = []
+
 async def admin_add_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    
-    # Получаем список пользователей из базы
-    users = DatabaseHandler.get_all_users()
-    
-    if not users:
-        await query.edit_message_text("❌ Нет зарегистрированных пользователей")
+
+    reset_user_picker(context)
+    text, markup, found = await render_user_picker(context)
+    if not found:
+        await safe_edit(query, "❌ Нет зарегистрированных пользователей")
         return ADMIN_MENU
-    
-    # Создаем кнопки с пользователями
-    keyboard = []
-    temp_row = []
-    for user in users:
-        user_id, first_name, last_name, username = user
-        name = f"{first_name} {last_name}".strip() or username or f"ID: {user_id}"
-        btn = InlineKeyboardButton(name, callback_data=f'add_admin_{user_id}')
-        
-        # Размещаем по 2 кнопки в строке
-        if len(temp_row) < 2:
-            temp_row.append(btn)
-        else:
-            keyboard.append(temp_row)
-            temp_row = [btn]
-    
-    if temp_row:
-        keyboard.append(temp_row)
-    
-    # Кнопка возврата
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_back')])
-    
-    await query.edit_message_text(
-        "Выберите пользователя из списка:",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+
+    await safe_edit(query, text, reply_markup=markup)
+    return ADD_ADMIN
+
+async def admin_users_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    pages = context.user_data.setdefault('admin_pages', [])
+    target = query.data.split('_')[2]
+    if target == 'prev':
+        context.user_data['admin_cursor'] = pages.pop() if pages else None
+    else:
+        pages.append(context.user_data.get('admin_cursor'))
+        context.user_data['admin_cursor'] = int(target)
+
+    text, markup, _ = await render_user_picker(context)
+    await safe_edit(query, text, reply_markup=markup)
+    return ADD_ADMIN
+
+async def admin_search_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    reset_user_picker(context, update.message.text.strip())
+    text, markup, _ = await render_user_picker(context)
+    await update.message.reply_text(text, reply_markup=markup)
     return ADD_ADMIN
 
 async def add_admin_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -770,23 +745,20 @@ async def add_admin_selected(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     user_id = int(query.data.split('_')[2])
     
-    if DatabaseHandler.is_admin(user_id):
-        await query.edit_message_text("⚠️ Этот пользователь уже администратор!",
+    if await admin_cache.is_admin(user_id):
+        await safe_edit(query, "⚠️ Этот пользователь уже администратор!",
         reply_markup=InlineKeyboardMarkup([
             [InlineKeyboardButton("🔙 В меню админов", callback_data='admin_back')]
         ]))
         return ADMIN_MENU
     
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute('INSERT INTO admins (user_id) VALUES (?)', (user_id,))
-        conn.commit()
-
-    user_info = next((u for u in DatabaseHandler.get_all_users() if u[0] == user_id), None)
-    name = f"ID: {user_id}"
-    if user_info:
-        name = f"{user_info[1]} {user_info[2]}".strip() or user_info[3] or name
+    await admin_cache.add(user_id)
+
+    user_info = await db.get_user(user_id)
+    name = user_display_name(*user_info) if user_info else f"ID: {user_id}"
     
-    await query.edit_message_text(
+    await safe_edit(
+        query,
         f"✅ {name} успешно добавлен в администраторы!",
         reply_markup=InlineKeyboardMarkup([
             [InlineKeyboardButton("🔙 В меню админов", callback_data='admin_back')]
@@ -798,7 +770,7 @@ async def admin_remove_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    admins = DatabaseHandler.get_admins_with_info()
+    admins = await db.get_admins_with_info()
     keyboard = []
     for admin in admins:
         user_id, first_name, last_name, username = admin
@@ -806,8 +778,8 @@ async def admin_remove_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         keyboard.append([InlineKeyboardButton(f"❌ {name}", callback_data=f'remove_admin_{user_id}')])
     
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='admin_back')])
-    await query.edit_message_text("Выберите администратора для удаления:", 
-                                reply_markup=InlineKeyboardMarkup(keyboard))
+    await safe_edit(query, "Выберите администратора для удаления:", 
+                    reply_markup=InlineKeyboardMarkup(keyboard))
     return REMOVE_ADMIN
 
 async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -815,11 +787,10 @@ async def remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     admin_id = int(query.data.split('_')[2])
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.execute('DELETE FROM admins WHERE user_id = ?', (admin_id,))
-        conn.commit()
+    await admin_cache.remove(admin_id)
     
-    await query.edit_message_text(
+    await safe_edit(
+        query,
         f"✅ Администратор {admin_id} удален!",
         reply_markup=InlineKeyboardMarkup([
             [InlineKeyboardButton("🔙 В меню админов", callback_data='admin_back')]
@@ -831,6 +802,7 @@ async def admin_close(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     await query.message.delete()
+    render_cache.forget(query.message.chat.id, query.message.message_id)
     return ConversationHandler.END
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -841,6 +813,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /start - Начать работу с ботом
 /help - Показать это сообщение
 /events - Просмотреть доступные события
+/myevents - Мои предстоящие события
+/search - Найти событие по названию или описанию
 /cancel - Отменить текущее действие
 
 ⚙️ *Админ-команды:*
@@ -850,9 +824,50 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(help_text, parse_mode='Markdown')
     
 async def my_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
-    context.user_data['my_events_page'] = 0
-    await show_my_events_page(update, context, user_id, 0)
+    """/myevents - предстоящие события, на которые записан пользователь"""
+    text, markup = await render_my_events(update.message.from_user.id)
+    await update.message.reply_text(text, reply_markup=markup)
+
+def my_events_cursor(direction: str, event) -> str:
+    """callback_data с курсором страницы: (starts_at, id) крайнего события"""
+    event_id, _, _, _, starts_at = event
+    return encode(f'my_{direction}', starts_at, event_id)
+
+async def render_my_events(user_id: int, direction: str = None, cursor: tuple = None):
+    """direction 'next' - страница после cursor, 'prev' - перед ним, None - первая страница"""
+    events = await db.get_user_events_page(
+        user_id, MY_EVENTS_PAGE_SIZE + 1,
+        after=cursor if direction == 'next' else None,
+        before=cursor if direction == 'prev' else None
+    )
+    more = len(events) > MY_EVENTS_PAGE_SIZE
+    if direction == 'prev':
+        events = events[-MY_EVENTS_PAGE_SIZE:]
+        has_prev, has_next = more, True
+    else:
+        events = events[:MY_EVENTS_PAGE_SIZE]
+        has_prev, has_next = direction == 'next', more
+
+    if not events:
+        if direction:
+            # Страница опустела (события прошли или запись отменена) - показываем первую
+            return await render_my_events(user_id)
+        return "У вас нет предстоящих записей. Выберите событие в /events", None
+
+    keyboard = []
+    for event in events:
+        eid, name, date, time, _ = event
+        btn_text = f"{date} {time} - {name[:30]}" if time else f"{date} - {name[:30]}"
+        keyboard.append([InlineKeyboardButton(btn_text, callback_data=encode('details', eid))])
+
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=my_events_cursor('prev', events[0])))
+    if has_next:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=my_events_cursor('next', events[-1])))
+    if navigation:
+        keyboard.append(navigation)
+    return "📋 Ваши предстоящие события:", InlineKeyboardMarkup(keyboard)
 
 def get_handlers():
     # Обработчик начала работы и получения контакта
@@ -868,7 +883,7 @@ def get_handlers():
     event_creation_conv = ConversationHandler(
         entry_points=[CommandHandler('addevent', add_event)],
         states={
-            DATE: [CallbackQueryHandler(date_received)],
+            DATE: [CallbackQueryHandler(date_received, pattern=pattern('nav', 'view'))],
             EVENT_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, name_received)],
             EVENT_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, description_received)],
             EVENT_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, time_received)],
@@ -879,15 +894,20 @@ def get_handlers():
 
     # Обработчик редактирования событий
     edit_event_conv = ConversationHandler(
-        entry_points=[CallbackQueryHandler(pattern=r'^edit_(\d+)$', callback=start_edit_event)],
+        entry_points=[
+            CallbackQueryHandler(start_edit_event, pattern=pattern('edit')),
+            CallbackQueryHandler(delete_event_handler, pattern=pattern('delete'))
+        ],
         states={
-            EDIT_CHOICE: [CallbackQueryHandler(edit_choice_handler)],
+            EDIT_CHOICE: [CallbackQueryHandler(
+                edit_choice_handler, pattern=r'^(edit_(name|desc|time|date|max)|delete_event|cancel_edit)$')],
             EDIT_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_name_handler)],
             EDIT_DESCRIPTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_description_handler)],
             EDIT_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_time_handler)],
-            EDIT_DATE: [CallbackQueryHandler(edit_date_handler)],
+            EDIT_DATE: [CallbackQueryHandler(edit_date_handler, pattern=pattern('nav', 'view'))],
             EDIT_MAX: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_max_handler)],
-            CONFIRM_DELETE: [CallbackQueryHandler(confirm_delete_handler)]
+            CONFIRM_DELETE: [CallbackQueryHandler(
+                confirm_delete_handler, pattern='^(confirm_delete|cancel_delete|cancel_edit)$')]
         },
         fallbacks=[CommandHandler('cancel', cancel_edit)],
         map_to_parent={ConversationHandler.END: ConversationHandler.END}
@@ -905,6 +925,9 @@ def get_handlers():
             ],
             ADD_ADMIN: [
                 CallbackQueryHandler(add_admin_selected, pattern=r'^add_admin_\d+$'),
+                CallbackQueryHandler(admin_users_page, pattern=r'^admin_users_(\d+|prev)$'),
+                CallbackQueryHandler(admin_add_handler, pattern='^admin_add$'),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, admin_search_handler),
                 CallbackQueryHandler(manage_admins, pattern='^admin_back$')
             ],
             REMOVE_ADMIN: [
@@ -915,16 +938,19 @@ def get_handlers():
         fallbacks=[CommandHandler('cancel', cancel)]
     )
 
-    return [
+    return with_handler_names([
         start_conv,
         event_creation_conv,
         edit_event_conv,
         admin_management_conv,
         CommandHandler('events', show_events),
         CommandHandler('help', help_command),
+        CommandHandler('myevents', my_events),
+        CommandHandler('search', search_command),
+        InlineQueryHandler(inline_search),
         CallbackQueryHandler(button_handler),
         MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
-    ]
+    ])
 
 # Добавляем обработчик для обычных текстовых сообщений
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,154 @@
+"""Логирование: запись в поток вне цикла событий, JSON-формат и контекст обновления.
+
+Обработчики логгеров только кладут запись в очередь (QueueHandler), форматирование
+и вывод выполняет поток QueueListener. Поля update_id, user_id и handler берутся
+из contextvars, которые выставляются при обработке обновления.
+"""
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from datetime import datetime, timezone
+
+update_id_var = contextvars.ContextVar('update_id', default=None)
+user_id_var = contextvars.ContextVar('user_id', default=None)
+handler_var = contextvars.ContextVar('handler', default=None)
+
+CONTEXT_FIELDS = ('update_id', 'user_id', 'handler')
+# Дополнительные поля, которые можно передать через extra=
+EXTRA_FIELDS = ('duration',)
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись контекст текущего обновления (в потоке, где вызван логгер)"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = update_id_var.get()
+        record.user_id = user_id_var.get()
+        record.handler = handler_var.get()
+        return True
+
+class DebugSampler(logging.Filter):
+    """Пропускает только долю rate записей уровня DEBUG, остальные уровни - все"""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS + EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат с контекстом обновления в конце строки"""
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = ' '.join(
+            f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS + EXTRA_FIELDS
+            if getattr(record, field, None) is not None
+        )
+        return f"{line} [{context}]" if context else line
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Очередь не покидает процесс, а других обработчиков у корневого логгера нет, поэтому
+    запись передается как есть: подстановка аргументов, JSON и вывод выполняются в потоке QueueListener
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_listener = None
+
+def setup_logging(level: str = 'INFO', fmt: str = 'text', debug_sample_rate: float = 1.0):
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_rate))
+    queue_handler.addFilter(ContextFilter())
+
+    # Форматы не используют поток и процесс - не собираем их для каждой записи
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # Строка на каждый HTTP-запрос к Bot API - только на DEBUG
+    logging.getLogger('httpx').setLevel(max(root.level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Дописывает накопленные записи и останавливает поток вывода"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+def bind_update(update_id, user_id):
+    update_id_var.set(update_id)
+    user_id_var.set(user_id)
+
+def with_handler_names(handlers: list) -> list:
+    """Оборачивает колбэки обработчиков (и вложенных в ConversationHandler):
+    имя колбэка попадает в поле handler всех записей, сделанных во время его работы
+    """
+    for handler in handlers:
+        if hasattr(handler, 'states'):
+            # ConversationHandler: свой колбэк не вызывается, оборачиваем вложенные
+            with_handler_names(handler.entry_points)
+            with_handler_names(handler.fallbacks)
+            for nested in handler.states.values():
+                with_handler_names(nested)
+        elif not getattr(handler.callback, '_named', False):
+            handler.callback = _named(handler.callback)
+    return handlers
+
+def _named(callback):
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        token = handler_var.set(name)
+        try:
+            return await callback(update, context)
+        finally:
+            handler_var.reset(token)
+
+    wrapper._named = True
+    return wrapper
+
+def log_duration(logger: logging.Logger, started: float, message: str, *args):
+    """DEBUG-запись с длительностью в поле duration (мс); при выключенном DEBUG ничего не стоит"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, *args, extra={'duration': round((time.perf_counter() - started) * 1000, 3)})
@@ -1,50 +1,85 @@
 import os
-import pytz
-from datetime import datetime, timedelta
-from telegram.ext import Application, JobQueue
-from config import logger, TIMEZONE
-from database import init_database
+import asyncio
+from telegram.ext import Application
+from config import (
+    logger, OUTBOX_POLL_INTERVAL, TELEGRAM_BASE_URL, WEBHOOK_URL, WEBHOOK_SECRET, CONCURRENT_UPDATES,
+    MAX_PENDING_PER_USER,
+    RETENTION_DAYS, OUTBOX_RETENTION_DAYS, RETENTION_INTERVAL
+)
+from database import init_database, close_database
+from cache import admin_cache
 from handlers import get_handlers
-from handlers import send_event_notifications
+from notifications import reminder_scheduler, sweep_outbox
+from retention import run_retention
+from update_processor import PerUserUpdateProcessor
+from metrics_server import metrics_server
+from telegram_request import InstrumentedRequest
 
 async def post_init(application: Application):
     await application.bot.set_my_commands([
         ("start", "Начать работу с ботом"),
         ("help", "Помощь и список команд"),
         ("events", "Просмотр событий"),
+        ("myevents", "Мои события"),
+        ("search", "Поиск событий"),
         ("addevent", "Создать событие (админ)"),
         ("admins", "Меню админов"),
         ("cancel", "Отменить действие")
     ])
+    await admin_cache.load()
+    await reminder_scheduler.start(application.job_queue)
+    await metrics_server.start()
 
-def main():
-    init_database()
+async def post_shutdown(application: Application):
+    await metrics_server.stop()
+    close_database()
 
+def build_application() -> Application:
     TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     if not TOKEN:
         raise ValueError("Токен не найден")
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        # Без секрета любой, кто достучится до порта, может прислать обновление от имени администратора
+        raise ValueError("Для режима вебхука нужен WEBHOOK_SECRET")
 
-    application = Application.builder() \
+    builder = Application.builder() \
         .token(TOKEN) \
+        .base_url(TELEGRAM_BASE_URL) \
+        .request(InstrumentedRequest(connection_pool_size=256)) \
+        .get_updates_request(InstrumentedRequest()) \
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES, max_pending_per_key=MAX_PENDING_PER_USER)) \
         .post_init(post_init) \
-        .build()
+        .post_shutdown(post_shutdown)
+    if WEBHOOK_URL:
+        # Обновления принимает собственный HTTP-сервер, Updater не нужен
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Регистрация обработчиков
     for handler in get_handlers():
         application.add_handler(handler)
 
-    # Настройка заданий
-    timezone = pytz.timezone(TIMEZONE)
-    desired_time = datetime.strptime("07:00", "%H:%M").time()
-    local_dt = timezone.localize(datetime.combine(datetime.now().date(), desired_time))
-    utc_time = local_dt.astimezone(pytz.utc).time()
-
-    application.job_queue.run_daily(
-        send_event_notifications,
-        time=utc_time
+    # Настройка заданий: напоминания отправляются по таймеру ReminderScheduler,
+    # периодическая проверка подхватывает изменения из других процессов
+    application.job_queue.run_repeating(
+        sweep_outbox,
+        interval=OUTBOX_POLL_INTERVAL
     )
+    # Архивация и очистка: первый прогон через минуту после запуска, не мешая старту
+    if RETENTION_DAYS or OUTBOX_RETENTION_DAYS:
+        application.job_queue.run_repeating(run_retention, interval=RETENTION_INTERVAL, first=60)
+
+    return application
+
+def main():
+    init_database()
+    application = build_application()
 
-    application.run_polling()
+    if WEBHOOK_URL:
+        from webhook import run_webhook
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from config import METRICS_ENABLED
+
+class Metric:
+    """Метрика с необязательными метками: значение хранится отдельно для каждого набора меток"""
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        return tuple(sorted(labels.items()))
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        return list(self._values.items())
+
+    def samples(self):
+        """Строки текстового формата Prometheus"""
+        for key, value in self.items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    """Распределение значений по корзинам (верхние границы), сумма и число наблюдений"""
+    TYPE = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [число попаданий в каждую корзину и в +Inf, сумма, количество]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, **labels):
+        """Число наблюдений"""
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def items(self):
+        with self._lock:
+            return [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+
+    def samples(self):
+        for key, (counts, total, count) in self.items():
+            cumulative = 0
+            for bound, hits in zip((*self.buckets, '+Inf'), counts):
+                cumulative += hits
+                yield f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {total}"
+            yield f"{self.name}_count{_format_labels(key)} {count}"
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+def timed(histogram: Histogram, **labels):
+    """Декоратор: длительность вызова функции или корутины в histogram"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+REGISTRY = {}
+
+# Запросы к БД короче обработчиков - корзины мельче
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# Обработка обновлений
+update_duration = Histogram('update_duration_seconds', 'Полная обработка одного обновления')
+handler_duration = Histogram('handler_duration_seconds', 'Длительность отдельных обработчиков и отрисовки')
+updates_dropped = Counter('updates_dropped_total', 'Обновления, отброшенные из-за переполнения очереди пользователя')
+
+# База данных
+sql_duration = Histogram('sql_duration_seconds', 'Вызовы DatabaseHandler по методам (число и длительность)', SQL_BUCKETS)
+db_size = Gauge('db_size_bytes', 'Размер основной БД, включая свободные страницы')
+db_free = Gauge('db_free_bytes', 'Свободные страницы основной БД (используются повторно или возвращаются системе)')
+retention_removed = Counter('retention_removed_total', 'Строки, перенесенные в архив или удаленные заданием хранения, по таблицам')
+retention_job_duration = Histogram('retention_job_duration_seconds', 'Длительность задания хранения')
+
+# Telegram Bot API
+telegram_request_duration = Histogram('telegram_request_duration_seconds', 'Длительность запросов к Bot API по методам')
+telegram_requests = Counter('telegram_requests_total', 'Запросы к Bot API по методам и HTTP-статусу (429 - превышение лимита)')
+
+# Очередь напоминаний
+outbox_delivered = Counter('outbox_delivered_total', 'Напоминания, обработанные воркером, по статусу')
+outbox_pending = Gauge('outbox_pending', 'Наступившие, но еще не отправленные напоминания')
+outbox_lag = Gauge('outbox_lag_seconds', 'Задержка отправки относительно запланированного времени')
+outbox_batch_duration = Gauge('outbox_batch_duration_seconds', 'Длительность обработки последней пачки')
+notification_job_duration = Histogram('notification_job_duration_seconds', 'Длительность задания отправки напоминаний')
+
+# Кнопки
+callback_duration = Histogram('callback_duration_seconds', 'Время обработки нажатий кнопок по маршрутам')
+callback_rejected = Counter('callback_rejected_total', 'Отклоненные callback_data по причине')
+edits_skipped = Counter('telegram_edits_skipped_total', 'Редактирования без изменений: пропущены по кэшу или отклонены Telegram')
@@ -0,0 +1,31 @@
+from aiohttp import web
+from config import METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT, logger
+from metrics import render
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class MetricsServer:
+    """Локальный HTTP-сервер для сборщика метрик (GET /metrics)"""
+    def __init__(self):
+        self._runner = None
+
+    async def start(self):
+        if not METRICS_ENABLED or self._runner is not None:
+            return
+
+        async def metrics(request: web.Request) -> web.Response:
+            return web.Response(body=render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+        app = web.Application()
+        app.router.add_get('/metrics', metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, METRICS_LISTEN, METRICS_PORT).start()
+        logger.info("Метрики доступны на http://%s:%s/metrics", METRICS_LISTEN, METRICS_PORT)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics_server = MetricsServer()
@@ -0,0 +1,417 @@
+"""Версионированные миграции схемы БД (номер версии хранится в PRAGMA user_version).
+
+Миграция - упорядоченный список шагов: SQL, функция conn -> None или Batched.
+Подряд идущие обычные шаги выполняются одной транзакцией, шаг Batched -
+пачками в коротких транзакциях, чтобы бот и другие процессы могли писать
+между ними. Версия записывается в последней транзакции миграции; если миграция
+прервалась, при следующем запуске она выполняется заново, поэтому шаги миграций
+с Batched должны быть идемпотентными (add_column, IF NOT EXISTS).
+
+Прогон на копии базы с замером времени каждого шага:
+
+    python migrations.py --dry-run [--db /app/data/events.db]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import NamedTuple
+import pytz
+from config import DB_NAME, MIGRATION_BATCH_SIZE, MIGRATION_BATCH_PAUSE, TIMEZONE, logger
+from database import ConnectionPool, _insert_reminders, local_timestamp, user_name_key, username_key
+
+# Меньше любого ключа: начальный курсор пачек
+START = float('-inf')
+
+class Batched(NamedTuple):
+    """Шаг миграции, выполняемый пачками.
+
+    step(conn, after, limit) обрабатывает до limit строк с ключом больше after
+    и возвращает последний обработанный ключ, None - строк больше нет
+    """
+    step: object
+    batch_size: int = MIGRATION_BATCH_SIZE
+
+def batched_update(table: str, key: str, sql: str, batch_size: int = MIGRATION_BATCH_SIZE) -> Batched:
+    """Batched для UPDATE по диапазону ключа: sql получает границы (after, last]"""
+    def step(conn, after, limit):
+        last = conn.execute(f'''
+            SELECT MAX({key}) FROM (SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?)
+        ''', (after, limit)).fetchone()[0]
+        if last is not None:
+            conn.execute(sql, (after, last))
+        return last
+
+    step.__name__ = f'batched_update({table})'
+    return Batched(step, batch_size)
+
+def add_column(table: str, column: str, definition: str):
+    """Шаг ALTER TABLE ADD COLUMN, который можно выполнить повторно"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    step.__name__ = f'add_column({table}.{column})'
+    return step
+
+def _backfill_outbox(conn, after, limit):
+    """Очередь напоминаний для уже существующих будущих событий"""
+    today = datetime.now(pytz.timezone(TIMEZONE)).strftime("%Y-%m-%d")
+    # Столбца starts_at на этой версии схемы еще нет (миграция 9)
+    rows = conn.execute(
+        'SELECT id, date, time FROM events WHERE id > ? AND date >= ? ORDER BY id LIMIT ?', (after, today, limit)
+    ).fetchall()
+    for event_id, date, time in rows:
+        starts_at = _start_or_none(date, time)
+        if starts_at is not None:
+            _insert_reminders(conn, event_id, starts_at)
+    return rows[-1][0] if rows else None
+
+def _move_deliveries(conn):
+    """Переносит журнал доставок в очередь; повторный запуск (журнал уже удален) ничего не делает"""
+    if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notification_deliveries'").fetchone():
+        return
+    conn.execute('''
+        INSERT OR IGNORE INTO notification_outbox (event_id, user_id, kind, due_at, status, attempts)
+        SELECT event_id, user_id, kind, 0, status, attempts FROM notification_deliveries
+    ''')
+    conn.execute('DROP TABLE notification_deliveries')
+
+def _backfill_user_keys(conn, after, limit):
+    rows = conn.execute('''
+        SELECT user_id, first_name, last_name, username FROM users
+        WHERE user_id > ? ORDER BY user_id LIMIT ?
+    ''', (after, limit)).fetchall()
+    conn.executemany(
+        'UPDATE users SET name_key = ?, username_key = ? WHERE user_id = ?',
+        ((user_name_key(first, last, username), username_key(username), user_id)
+         for user_id, first, last, username in rows)
+    )
+    return rows[-1][0] if rows else None
+
+def _start_or_none(date: str, time: str):
+    try:
+        return local_timestamp(date, time)
+    except ValueError:
+        # Дата или время не в формате бота: событие не попадет в выборки по starts_at
+        logger.warning("Не удалось разобрать дату и время события: %r %r", date, time)
+        return None
+
+def _backfill_starts_at(conn, after, limit):
+    rows = conn.execute(
+        'SELECT id, date, time FROM events WHERE id > ? ORDER BY id LIMIT ?', (after, limit)).fetchall()
+    conn.executemany(
+        'UPDATE events SET starts_at = ?, timezone = ? WHERE id = ?',
+        ((_start_or_none(date, time), TIMEZONE, event_id) for event_id, date, time in rows)
+    )
+    return rows[-1][0] if rows else None
+
+# Начало события для participants.starts_at; если время не разобралось - полночь даты (UTC)
+def _event_start(event: str) -> str:
+    return f"COALESCE({event}.starts_at, CAST(strftime('%s', {event}.date) AS INTEGER))"
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    steps: list
+
+MIGRATIONS = [
+    Migration(1, "Индексы для выборок дат по месяцу и событий пользователя", [
+        # Покрывающий индекс для выборок дат по диапазону месяца
+        'CREATE INDEX IF NOT EXISTS idx_events_date_id ON events(date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_participants_user_event ON participants(user_id, event_id)',
+        # Дублируются индексом idx_events_date_id и первичным ключом participants
+        'DROP INDEX IF EXISTS idx_events_date',
+        'DROP INDEX IF EXISTS idx_participants_event_id',
+    ]),
+    Migration(2, "Состояние доставки напоминаний", [
+        '''
+        CREATE TABLE IF NOT EXISTS notification_deliveries (
+            event_id INTEGER,
+            user_id INTEGER,
+            kind TEXT,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(event_id, user_id, kind)
+        )
+        ''',
+    ]),
+    Migration(3, "Очередь напоминаний вместо журнала доставок", [
+        '''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            due_at INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(event_id, user_id, kind)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_status_due ON notification_outbox(status, due_at)',
+        _move_deliveries,
+        Batched(_backfill_outbox, 200),
+    ]),
+    Migration(4, "Ежедневная рассылка заменена напоминаниями за REMINDER_OFFSETS до события", [
+        "DELETE FROM notification_outbox WHERE kind = 'daily' AND status = 'pending'",
+        Batched(_backfill_outbox, 200),
+    ]),
+    Migration(5, "Денормализованный счетчик участников, поддерживается триггерами", [
+        add_column('events', 'participant_count', 'INTEGER NOT NULL DEFAULT 0'),
+        # Триггеры создаются до пересчета: записи, сделанные между пачками, учитываются ими
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_participants_insert AFTER INSERT ON participants
+        BEGIN
+            UPDATE events SET participant_count = participant_count + 1 WHERE id = NEW.event_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_participants_delete AFTER DELETE ON participants
+        BEGIN
+            UPDATE events SET participant_count = participant_count - 1 WHERE id = OLD.event_id;
+        END
+        ''',
+        batched_update('events', 'id', '''
+            UPDATE events SET participant_count = (
+                SELECT COUNT(*) FROM participants WHERE event_id = events.id
+            )
+            WHERE id > ? AND id <= ?
+        '''),
+    ]),
+    Migration(6, "Версия списка администраторов: процессы с общей БД замечают изменения по ней", [
+        'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('admins_version', 1)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_insert AFTER INSERT ON admins
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'admins_version';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_delete AFTER DELETE ON admins
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'admins_version';
+        END
+        ''',
+    ]),
+    Migration(7, "Постраничный выбор пользователей и поиск по началу имени или username", [
+        add_column('users', 'name_key', "TEXT NOT NULL DEFAULT ''"),
+        add_column('users', 'username_key', "TEXT NOT NULL DEFAULT ''"),
+        Batched(_backfill_user_keys),
+        'CREATE INDEX IF NOT EXISTS idx_users_name_key ON users(name_key, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_users_username_key ON users(username_key)',
+    ]),
+    Migration(8, "Полнотекстовый поиск по названию и описанию событий (внешнее содержимое - events)", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+            name, description,
+            content='events', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        "INSERT INTO events_fts(events_fts) VALUES ('rebuild')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_insert AFTER INSERT ON events
+        BEGIN
+            INSERT INTO events_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_delete AFTER DELETE ON events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_events_fts_update AFTER UPDATE OF name, description ON events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, description)
+            VALUES ('delete', OLD.id, OLD.name, OLD.description);
+            INSERT INTO events_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        ''',
+    ]),
+    Migration(9, "Начало события в UTC epoch и часовой пояс, в котором заданы дата и время", [
+        add_column('events', 'starts_at', 'INTEGER'),
+        add_column('events', 'timezone', 'TEXT'),
+        Batched(_backfill_starts_at),
+        # События дня выбираются диапазоном по starts_at, сразу в порядке начала
+        'CREATE INDEX IF NOT EXISTS idx_events_starts_at ON events(starts_at)',
+    ]),
+    Migration(10, "Начало события в записях участников: /myevents по индексу (user_id, starts_at, event_id)", [
+        add_column('participants', 'starts_at', 'INTEGER'),
+        # Триггеры создаются до пересчета, как в миграции 5
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_participants_starts_at AFTER INSERT ON participants
+        WHEN NEW.starts_at IS NULL
+        BEGIN
+            UPDATE participants SET starts_at = (SELECT {_event_start('e')} FROM events e WHERE e.id = NEW.event_id)
+            WHERE event_id = NEW.event_id AND user_id = NEW.user_id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_events_starts_at AFTER UPDATE OF date, starts_at ON events
+        BEGIN
+            UPDATE participants SET starts_at = {_event_start('NEW')} WHERE event_id = NEW.id;
+        END
+        ''',
+        batched_update('events', 'id', f'''
+            UPDATE participants
+            SET starts_at = (SELECT {_event_start('e')} FROM events e WHERE e.id = participants.event_id)
+            WHERE event_id > ? AND event_id <= ?
+        '''),
+        'CREATE INDEX IF NOT EXISTS idx_participants_user_start ON participants(user_id, starts_at, event_id)',
+        # Выборки по user_id обслуживает новый индекс
+        'DROP INDEX IF EXISTS idx_participants_user_event',
+    ]),
+]
+
+class StepTiming(NamedTuple):
+    version: int
+    step: str
+    seconds: float
+    # Транзакций шага (0 - выполнен в общей транзакции с соседними шагами)
+    transactions: int
+    # Самая долгая транзакция, в которой выполнялся шаг: столько другие процессы ждут записи
+    longest: float
+
+def step_name(step) -> str:
+    if isinstance(step, Batched):
+        return f"{step.step.__name__} (пачки по {step.batch_size})"
+    if callable(step):
+        return step.__name__
+    return ' '.join(step.split())[:70]
+
+def _transaction(conn, steps: list, version: int = None) -> tuple:
+    """Выполняет шаги одной транзакцией; возвращает (длительности шагов, длительность транзакции)"""
+    durations = []
+    started = time.perf_counter()
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for step in steps:
+            step_started = time.perf_counter()
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+            durations.append(time.perf_counter() - step_started)
+        if version is not None:
+            conn.execute(f'PRAGMA user_version = {version}')
+    return durations, time.perf_counter() - started
+
+def _run_batched(conn, step: Batched) -> tuple:
+    """Выполняет шаг пачками; возвращает (число транзакций, самая долгая)"""
+    after, transactions, longest = START, 0, 0.0
+    while after is not None:
+        started = time.perf_counter()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            after = step.step(conn, after, step.batch_size)
+        transactions += 1
+        longest = max(longest, time.perf_counter() - started)
+        if after is not None and MIGRATION_BATCH_PAUSE:
+            # Пауза между пачками: ожидающие записи других соединений успевают взять блокировку
+            time.sleep(MIGRATION_BATCH_PAUSE)
+    return transactions, longest
+
+def run_migration(conn, migration: Migration) -> list:
+    timings = []
+    group = []
+
+    def flush(version: int = None):
+        if group or version is not None:
+            durations, total = _transaction(conn, group, version)
+            timings.extend(StepTiming(migration.version, step_name(step), seconds, 0, total)
+                           for step, seconds in zip(group, durations))
+            group.clear()
+
+    for step in migration.steps:
+        if isinstance(step, Batched):
+            flush()
+            started = time.perf_counter()
+            transactions, longest = _run_batched(conn, step)
+            timings.append(StepTiming(migration.version, step_name(step),
+                                      time.perf_counter() - started, transactions, longest))
+        else:
+            group.append(step)
+    flush(migration.version)
+    return timings
+
+def migrate(conn, migrations: list = MIGRATIONS) -> list:
+    """Применяет миграции новее PRAGMA user_version; возвращает замеры шагов"""
+    versions = [migration.version for migration in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError(f"Версии миграций должны возрастать: {versions}")
+
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if versions and version > versions[-1]:
+        logger.warning("Версия схемы БД %s новее известной коду (%s)", version, versions[-1])
+
+    timings = []
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        started = time.perf_counter()
+        timings += run_migration(conn, migration)
+        logger.info("Схема БД обновлена до версии %s за %.2f с: %s",
+                    migration.version, time.perf_counter() - started, migration.description)
+    return timings
+
+def dry_run(path: str) -> list:
+    """Прогон ожидающих миграций на копии базы (онлайн-копия через backup API)"""
+    handle, copy_path = tempfile.mkstemp(prefix='dry-run-', suffix='.db', dir=os.path.dirname(path))
+    os.close(handle)
+    copy_pool = ConnectionPool(copy_path, 1)
+    try:
+        started = time.perf_counter()
+        source = sqlite3.connect(path)
+        try:
+            source.backup(copy_pool.connection())
+        finally:
+            source.close()
+        print(f"Копия {path}: {time.perf_counter() - started:.1f} с")
+        return migrate(copy_pool.connection())
+    finally:
+        copy_pool.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(copy_path + suffix):
+                os.remove(copy_path + suffix)
+
+def print_report(timings: list):
+    if not timings:
+        print("Схема актуальна, ожидающих миграций нет")
+        return
+    for timing in timings:
+        batches = f" - транзакций: {timing.transactions}, самая долгая {timing.longest:.2f} с" \
+            if timing.transactions else ''
+        print(f"  v{timing.version}: {timing.seconds:8.2f} с  {timing.step}{batches}")
+    print(f"Итого: {sum(timing.seconds for timing in timings):.2f} с, "
+          f"самая долгая блокировка записи: {max(timing.longest for timing in timings):.2f} с")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_NAME)
+    parser.add_argument('--dry-run', action='store_true', help='выполнить на копии базы и показать время шагов')
+    args = parser.parse_args()
+
+    if args.dry_run:
+        print_report(dry_run(args.db))
+    else:
+        pool = ConnectionPool(args.db, 1)
+        try:
+            print_report(migrate(pool.connection()))
+        finally:
+            pool.close()
+
+if __name__ == '__main__':
+    main()
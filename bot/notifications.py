@@ -0,0 +1,219 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import pytz
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.ext import ContextTypes
+from config import (
+    TIMEZONE, NOTIFY_RATE, NOTIFY_CONCURRENCY, NOTIFY_PER_CHAT_INTERVAL, NOTIFY_MAX_ATTEMPTS,
+    OUTBOX_BATCH_SIZE, OUTBOX_MAX_LAG, OUTBOX_SENDING_LEASE, logger
+)
+from database import db
+from metrics import (
+    outbox_delivered, outbox_pending, outbox_lag, outbox_batch_duration, notification_job_duration, timed
+)
+
+class TokenBucket:
+    """Ограничитель частоты: не более rate отправок в секунду с запасом capacity"""
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (Telegram вернул RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+class NotificationDispatcher:
+    """Параллельная рассылка напоминаний из очереди с глобальным и поканальным
+    ограничением частоты. Результат каждой отправки сразу фиксируется в notification_outbox.
+    """
+    def __init__(self, bot, rate: float = NOTIFY_RATE, concurrency: int = NOTIFY_CONCURRENCY):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self._chat_last_sent = {}
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def dispatch(self, rows):
+        """rows - пачка из DatabaseHandler.claim_outbox_batch"""
+        queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait(row)
+
+        async def worker():
+            while True:
+                try:
+                    row = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self._deliver(*row)
+                except Exception as e:
+                    # Ошибка БД при записи результата: строка остается в 'sending' и вернется
+                    # в очередь через OUTBOX_SENDING_LEASE, остальные строки отправляются дальше
+                    logger.error("Напоминание %s не обработано: %s", row[0], e, exc_info=True)
+
+        # dispatch возвращается только после завершения всех воркеров
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()))),
+                             return_exceptions=True)
+
+    async def _wait_for_chat(self, chat_id: int):
+        # Резервируем слот до ожидания, чтобы параллельные отправки в один чат не совпали
+        now = time.monotonic()
+        slot = max(now, self._chat_last_sent.get(chat_id, now - NOTIFY_PER_CHAT_INTERVAL) + NOTIFY_PER_CHAT_INTERVAL)
+        self._chat_last_sent[chat_id] = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _deliver(self, outbox_id, event_id, user_id, kind, due_at, attempts, name, date, event_time):
+        text = reminder_text(kind, name, date, event_time)
+        while True:
+            await self._wait_for_chat(user_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=text)
+            except RetryAfter as e:
+                logger.warning("Превышен лимит Telegram, пауза %s с", e.retry_after)
+                self.bucket.pause(float(e.retry_after))
+                continue
+            except (Forbidden, BadRequest) as e:
+                # Пользователь заблокировал бота или чат недоступен - повтор не поможет
+                logger.error("Уведомление пользователю %s не доставлено: %s", user_id, e)
+                await self._complete(outbox_id, 'failed', str(e))
+                return
+            except Exception as e:
+                # Сетевая или любая другая ошибка отправки - повтор с нарастающей паузой
+                if attempts >= NOTIFY_MAX_ATTEMPTS:
+                    logger.error("Уведомление пользователю %s не доставлено после %s попыток: %s", user_id, attempts, e)
+                    await self._complete(outbox_id, 'failed', str(e))
+                else:
+                    delay = min(60 * 2 ** (attempts - 1), 3600)
+                    logger.warning("Ошибка отправки уведомления (%s), повтор через %s с", e, delay)
+                    await self._complete(outbox_id, 'pending', str(e), int(time.time()) + delay)
+                return
+
+            await self._complete(outbox_id, 'sent')
+            outbox_lag.set(max(0, time.time() - due_at))
+            return
+
+    async def _complete(self, outbox_id: int, status: str, error: str = None, retry_at: int = None):
+        await db.complete_outbox(outbox_id, status, error, retry_at)
+        outbox_delivered.inc(status=status)
+        if status == 'sent':
+            self.sent += 1
+        elif status == 'failed':
+            self.failed += 1
+        else:
+            self.retried += 1
+
+def reminder_text(kind: str, name: str, date: str, event_time: str) -> str:
+    today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    if date == today.strftime("%Y-%m-%d"):
+        day = "сегодня"
+    elif date == (today + timedelta(days=1)).strftime("%Y-%m-%d"):
+        day = "завтра"
+    else:
+        day = date
+    return f"⏰ Напоминание: {day} в {event_time or 'течение дня'} - {name}"
+
+async def recover_outbox():
+    """Вызывается при старте: возвращает в очередь прерванные отправки"""
+    recovered = await db.recover_outbox()
+    if recovered:
+        logger.info("Возвращено в очередь прерванных напоминаний: %s", recovered)
+
+class ReminderScheduler:
+    """Будит отправку точно к сроку ближайшего напоминания.
+
+    Сроки хранятся в notification_outbox с индексом (status, due_at), поэтому
+    в памяти держится один таймер, а работа зависит только от числа наступивших напоминаний.
+    """
+    JOB_NAME = 'reminders'
+
+    def __init__(self):
+        self.job_queue = None
+        self._armed_at = None
+
+    async def start(self, job_queue):
+        self.job_queue = job_queue
+        await recover_outbox()
+        await self.arm()
+
+    async def arm(self):
+        """Перепланирует таймер после изменения очереди (запись, перенос события)"""
+        if self.job_queue is None:
+            return
+        next_due = await db.get_next_reminder_due()
+        if next_due is None or (self._armed_at is not None and self._armed_at <= next_due):
+            return
+        for job in self.job_queue.get_jobs_by_name(self.JOB_NAME):
+            job.schedule_removal()
+        self._armed_at = next_due
+        self.job_queue.run_once(self._fire, when=max(0.0, next_due - time.time()), name=self.JOB_NAME)
+
+    async def _fire(self, context: ContextTypes.DEFAULT_TYPE):
+        self._armed_at = None
+        try:
+            await drain_outbox(context)
+        finally:
+            # Иначе после ошибки отправки таймер не заводится до следующей записи на событие
+            await self.arm()
+
+reminder_scheduler = ReminderScheduler()
+
+async def sweep_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Страховочная периодическая проверка: отправляет наступившее и заново заводит таймер"""
+    try:
+        await drain_outbox(context)
+    finally:
+        await reminder_scheduler.arm()
+
+# Таймер и страховочная проверка - разные задания и могут совпасть по времени; у каждого
+# вызова свой NotificationDispatcher, поэтому одновременная рассылка превысила бы NOTIFY_RATE
+_drain_lock = asyncio.Lock()
+
+@timed(notification_job_duration)
+async def drain_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Отправляет все наступившие напоминания пачками; вызовы выполняются по очереди"""
+    async with _drain_lock:
+        await _drain(NotificationDispatcher(context.bot))
+
+async def _drain(dispatcher: NotificationDispatcher):
+    while True:
+        started = time.monotonic()
+        now = int(time.time())
+        batch = await db.claim_outbox_batch(
+            now, OUTBOX_BATCH_SIZE, now - OUTBOX_MAX_LAG, now - OUTBOX_SENDING_LEASE)
+        if not batch:
+            break
+        await dispatcher.dispatch(batch)
+        outbox_batch_duration.set(time.monotonic() - started)
+
+    pending = await db.get_outbox_pending(int(time.time()))
+    outbox_pending.set(pending)
+    if dispatcher.sent or dispatcher.failed or dispatcher.retried:
+        logger.info(
+            "Напоминания: %s доставлено, %s с ошибкой, %s отложено; не отправлено наступивших %s, задержка %.0f с",
+            dispatcher.sent, dispatcher.failed, dispatcher.retried, pending, outbox_lag.value()
+        )
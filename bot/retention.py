@@ -0,0 +1,144 @@
+"""Хранение данных: архивация прошедших событий и очистка очереди напоминаний.
+
+Раз в RETENTION_INTERVAL задание переносит события, начавшиеся больше RETENTION_DAYS
+дней назад, вместе с участниками в архивную БД ARCHIVE_DB_NAME и удаляет завершенные
+напоминания старше OUTBOX_RETENTION_DAYS. Удаление идет пачками в коротких транзакциях
+с паузами, освободившиеся страницы возвращаются системе через incremental_vacuum,
+затем выполняется PRAGMA optimize.
+
+Разовый прогон; --vacuum после него пересобирает файл и включает auto_vacuum=INCREMENTAL
+у базы, созданной до появления задания (VACUUM блокирует запись, бота лучше остановить):
+
+    python retention.py [--db /app/data/events.db] [--vacuum]
+"""
+import argparse
+import asyncio
+import time
+from typing import NamedTuple
+from telegram.ext import ContextTypes
+from config import (
+    DB_NAME, RETENTION_DAYS, OUTBOX_RETENTION_DAYS, RETENTION_BATCH_SIZE, OUTBOX_PURGE_BATCH_SIZE,
+    RETENTION_BATCH_PAUSE, RETENTION_VACUUM_PAGES, logger
+)
+import database
+from cache import calendar_cache, event_cache
+from database import ConnectionPool, DatabaseHandler, StorageStats, db
+from metrics import db_size, db_free, retention_removed, retention_job_duration, timed
+
+INCREMENTAL = 2
+DAY = 24 * 3600
+MB = 1024 * 1024
+
+class RetentionReport(NamedTuple):
+    events: int
+    participants: int
+    outbox: int
+    before: StorageStats
+    after: StorageStats
+    seconds: float
+
+    @property
+    def reclaimed(self) -> int:
+        """Освобождено внутри файла и возвращено системе, байт"""
+        return self.before.size - self.before.free - (self.after.size - self.after.free)
+
+async def archive_events(before: int) -> tuple:
+    events = participants = 0
+    while True:
+        archived, removed = await db.archive_events(before, RETENTION_BATCH_SIZE)
+        if not archived:
+            return events, participants
+        events += len(archived)
+        participants += removed
+        for event_id, date in archived:
+            event_cache.invalidate(event_id)
+        for date in {date for _, date in archived}:
+            calendar_cache.invalidate_event_date(date, with_participants=True)
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+async def purge_outbox(before: int) -> int:
+    deleted = 0
+    while True:
+        batch = await db.purge_outbox(before, OUTBOX_PURGE_BATCH_SIZE)
+        deleted += batch
+        if batch < OUTBOX_PURGE_BATCH_SIZE:
+            return deleted
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+async def release_free_pages(stats: StorageStats):
+    """Возвращает свободные страницы системе порциями по RETENTION_VACUUM_PAGES"""
+    if stats.auto_vacuum != INCREMENTAL:
+        return
+    free = stats.freelist_count
+    while free:
+        remaining = await db.incremental_vacuum(RETENTION_VACUUM_PAGES)
+        # Параллельные удаления бота могут освобождать страницы быстрее, чем мы их отдаем
+        if remaining >= free:
+            return
+        free = remaining
+        await asyncio.sleep(RETENTION_BATCH_PAUSE)
+
+async def retention_pass() -> RetentionReport:
+    started = time.monotonic()
+    before = await db.get_storage_stats()
+    now = int(time.time())
+    events = participants = outbox = 0
+    if RETENTION_DAYS:
+        events, participants = await archive_events(now - RETENTION_DAYS * DAY)
+    if OUTBOX_RETENTION_DAYS:
+        outbox = await purge_outbox(now - OUTBOX_RETENTION_DAYS * DAY)
+    await release_free_pages(await db.get_storage_stats())
+    await db.optimize()
+    after = await db.get_storage_stats()
+
+    retention_removed.inc(events, table='events')
+    retention_removed.inc(participants, table='participants')
+    retention_removed.inc(outbox, table='notification_outbox')
+    db_size.set(after.size)
+    db_free.set(after.free)
+    return RetentionReport(events, participants, outbox, before, after, time.monotonic() - started)
+
+def log_report(report: RetentionReport):
+    logger.info(
+        "Хранение: в архив перенесено %s событий и %s записей участников, удалено %s напоминаний "
+        "за %.1f с; БД %.1f -> %.1f МБ, освобождено %.1f МБ, свободно в файле %.1f МБ",
+        report.events, report.participants, report.outbox, report.seconds,
+        report.before.size / MB, report.after.size / MB, report.reclaimed / MB, report.after.free / MB
+    )
+    if report.after.auto_vacuum != INCREMENTAL and report.after.freelist_count:
+        logger.info("Свободные страницы используются повторно, но файл не уменьшается: "
+                    "для возврата места системе выполните python retention.py --vacuum")
+
+@timed(retention_job_duration)
+async def run_retention(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическое задание хранения"""
+    try:
+        log_report(await retention_pass())
+    except Exception as e:
+        logger.error("Ошибка задания хранения: %s", e, exc_info=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_NAME)
+    parser.add_argument('--vacuum', action='store_true', help='пересобрать файл после прогона (VACUUM)')
+    args = parser.parse_args()
+
+    if args.db != database.pool.path:
+        database.pool.close()
+        database.pool = ConnectionPool(args.db, 1)
+    try:
+        report = asyncio.run(retention_pass())
+        print(f"Перенесено в архив: {report.events} событий, {report.participants} записей участников; "
+              f"удалено напоминаний: {report.outbox}; {report.seconds:.1f} с")
+        if args.vacuum:
+            started = time.monotonic()
+            DatabaseHandler.vacuum()
+            print(f"VACUUM: {time.monotonic() - started:.1f} с")
+        after = DatabaseHandler.get_storage_stats()
+        print(f"Размер БД: {report.before.size / MB:.1f} -> {after.size / MB:.1f} МБ, "
+              f"свободно в файле {after.free / MB:.1f} МБ, auto_vacuum={after.auto_vacuum}")
+    finally:
+        database.pool.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import time
+from telegram.request import HTTPXRequest
+from metrics import telegram_request_duration, telegram_requests
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с учетом длительности и HTTP-статусов запросов к Bot API"""
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        status = 'error'
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            return status, payload
+        finally:
+            telegram_request_duration.observe(time.perf_counter() - started, method=api_method)
+            telegram_requests.inc(method=api_method, status=str(status))
@@ -1,104 +1,95 @@
-from datetime import datetime, timedelta
+import functools
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-import sqlite3
-from config import DB_NAME
+from config import CALENDAR_CACHE_SIZE
+from cache import calendar_cache
+from callbacks import encode
+from metrics import handler_duration, timed
+
+# Локализация
+MONTHS_RU = (
+    'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+    'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
+)
+WEEKDAYS_RU = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+
+# Кнопки без данных одинаковы во всех календарях - создаем их один раз
+IGNORE = encode('ignore')
+EMPTY_BUTTON = InlineKeyboardButton(" ", callback_data=IGNORE)
+WEEKDAYS_ROW = tuple(InlineKeyboardButton(day, callback_data=IGNORE) for day in WEEKDAYS_RU)
+
+class DayCell(NamedTuple):
+    day: int
+    date_str: str
+    callback_data: str
+    # Кнопка дня без событий, переиспользуется при каждой отрисовке
+    plain_button: InlineKeyboardButton
+
+class MonthLayout(NamedTuple):
+    header: tuple
+    # Недели месяца: DayCell или None для пустых клеток
+    weeks: tuple
+    navigation: tuple
+
+@functools.lru_cache(maxsize=CALENDAR_CACHE_SIZE)
+def month_layout(year: int, month: int) -> MonthLayout:
+    """Статическая сетка месяца: смещение дней недели, даты и callback_data"""
+    first_day = date(year, month, 1)
+    last_day = date(year + month//12, month%12 + 1, 1) - timedelta(days=1)
+
+    cells = [None] * first_day.weekday()
+    for day in range(1, last_day.day + 1):
+        date_str = f"{year}-{month:02}-{day:02}"
+        callback_data = encode('view', date_str)
+        cells.append(DayCell(day, date_str, callback_data,
+                             InlineKeyboardButton(str(day), callback_data=callback_data)))
+    cells += [None] * (-len(cells) % 7)
+    weeks = tuple(tuple(cells[i:i + 7]) for i in range(0, len(cells), 7))
+
+    prev_year, prev_month = (year-1, 12) if month == 1 else (year, month-1)
+    next_year, next_month = (year+1, 1) if month == 12 else (year, month+1)
+
+    return MonthLayout(
+        header=(InlineKeyboardButton(f"{MONTHS_RU[month-1]} {year}", callback_data=IGNORE),),
+        weeks=weeks,
+        navigation=(
+            InlineKeyboardButton("<", callback_data=encode('nav', (prev_year, prev_month))),
+            InlineKeyboardButton(">", callback_data=encode('nav', (next_year, next_month)))
+        )
+    )
 
 class Calendar:
     @staticmethod
-    def create_calendar(year=None, month=None, user_id=None):
+    @timed(handler_duration, handler='create_calendar')
+    async def create_calendar(year=None, month=None, user_id=None):
         now = datetime.now()
         year = year or now.year
         month = month or now.month
-        
-        # Получаем данные из БД
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            
-            # Даты с любыми событиями
-            cursor.execute('''
-                SELECT DISTINCT date 
-                FROM events 
-                WHERE strftime('%Y-%m', date) = ?
-            ''', (f"{year}-{month:02}",))
-            event_dates = {row[0] for row in cursor.fetchall()}
-            
-            # Даты с участием пользователя
-            user_event_dates = set()
-            if user_id:
-                cursor.execute('''
-                    SELECT DISTINCT e.date
-                    FROM events e
-                    JOIN participants p ON e.id = p.event_id
-                    WHERE p.user_id = ? 
-                    AND strftime('%Y-%m', e.date) = ?
-                ''', (user_id, f"{year}-{month:02}"))
-                user_event_dates = {row[0] for row in cursor.fetchall()}
-
-        # Локализация
-        months_ru = [
-            'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-            'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
-        ]
-        
-        # Создаем структуру календаря
-        keyboard = [
-            [InlineKeyboardButton(f"{months_ru[month-1]} {year}", callback_data='ignore')],
-            [InlineKeyboardButton(day, callback_data='ignore') for day in ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]]
-        ]
-
-        # Рассчитываем дни месяца
-        first_day = datetime(year, month, 1)
-        last_day = datetime(year + month//12, month%12 + 1, 1) - timedelta(days=1)
-        
-        # Пустые дни в начале
-        week = [InlineKeyboardButton(" ", callback_data='ignore') 
-               for _ in range(first_day.weekday() % 7)]
-
-        # Заполняем дни
-        for day in range(1, last_day.day + 1):
-            current_date = datetime(year, month, day)
-            date_str = current_date.strftime("%Y-%m-%d")
-            
-            # Определяем стиль кнопки
-            is_today = current_date.date() == now.date()
-            has_events = date_str in event_dates
-            has_participation = date_str in user_event_dates
-            
-            emoji = ""
-            if has_participation:
-                emoji = "📌"
-            elif has_events:
-                emoji = "|"
-                
-            day_str = f"{emoji}{day}{'|' if has_events and not has_participation else ''}"
-
-            week.append(InlineKeyboardButton(
-                day_str,
-                callback_data=f'view_{date_str}'
-            ))
-            
-            # Новая неделя
-            if len(week) == 7:
-                keyboard.append(week)
-                week = []
 
-        # Пустые дни в конце
-        if week:
-            week += [InlineKeyboardButton(" ", callback_data='ignore')] * (7 - len(week))
-            keyboard.append(week)
+        # Даты с любыми событиями и даты с участием пользователя (из кэша или БД)
+        event_dates, user_event_dates = await calendar_cache.get_dates(year, month, user_id)
+        layout = month_layout(year, month)
 
-        # Навигация
-        prev_year, prev_month = (year-1, 12) if month == 1 else (year, month-1)
-        next_year, next_month = (year+1, 1) if month == 12 else (year, month+1)
-        
-        keyboard.append([
-            InlineKeyboardButton("<", callback_data=f'nav_{prev_year}-{prev_month}'),
-            InlineKeyboardButton(">", callback_data=f'nav_{next_year}-{next_month}')
-        ])
+        # Собираем клавиатуру из готовой сетки, создавая кнопки только для отмеченных дней
+        keyboard = [layout.header, WEEKDAYS_ROW]
+        for week in layout.weeks:
+            row = []
+            for cell in week:
+                if cell is None:
+                    row.append(EMPTY_BUTTON)
+                elif cell.date_str in user_event_dates:
+                    row.append(InlineKeyboardButton(f"📌{cell.day}", callback_data=cell.callback_data))
+                elif cell.date_str in event_dates:
+                    row.append(InlineKeyboardButton(f"|{cell.day}|", callback_data=cell.callback_data))
+                else:
+                    row.append(cell.plain_button)
+            keyboard.append(row)
+        keyboard.append(layout.navigation)
 
         return InlineKeyboardMarkup(keyboard)
 
     @staticmethod
     def get_current_month():
         now = datetime.now()
-        return now.year, now.month
\ No newline at end of file
+        return now.year, now.month
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+from config import logger
+from log import bind_update, log_duration
+from metrics import update_duration, updates_dropped
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей.
+
+    Обновления одного пользователя (или чата, если пользователя нет) обрабатываются
+    строго по очереди, поэтому диалоги ConversationHandler и повторные нажатия
+    одной кнопки остаются последовательными.
+
+    Семафор базового класса ограничивает число принятых обновлений (max_pending),
+    а число одновременно выполняемых - собственный семафор, который захватывается
+    только после блокировки пользователя. Слот max_pending обновление держит и пока
+    ждет своей очереди, поэтому у одного ключа их не больше max_pending_per_key:
+    лишние отбрасываются (на нажатия кнопок бот отвечает коротким уведомлением),
+    и поток нажатий одного пользователя не вытесняет остальных.
+    """
+    def __init__(self, max_concurrent_updates: int, max_pending: int = None, max_pending_per_key: int = 8):
+        super().__init__(max_pending or max_concurrent_updates * 16)
+        self._workers = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._max_pending_per_key = max_pending_per_key
+        # Ключ -> [блокировка, число ожидающих обновлений]
+        self._locks = {}
+
+    @staticmethod
+    def _key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return 'user', update.effective_user.id
+        if update.effective_chat:
+            return 'chat', update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._workers:
+                await self._run(update, coroutine)
+            return
+
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        if entry[1] >= self._max_pending_per_key:
+            coroutine.close()
+            await self._drop(update, key)
+            return
+        entry[1] += 1
+        try:
+            async with entry[0], self._workers:
+                await self._run(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    @staticmethod
+    async def _drop(update: Update, key: tuple):
+        updates_dropped.inc()
+        logger.warning("Очередь %s %s переполнена, обновление %s отброшено", *key, update.update_id)
+        # Иначе кнопка у пользователя крутится до тайм-аута клиента
+        if update.callback_query:
+            try:
+                await update.callback_query.answer("⏳ Слишком много запросов, подождите немного")
+            except TelegramError as e:
+                logger.warning("Не удалось ответить на отброшенное нажатие: %s", e)
+
+    @staticmethod
+    async def _run(update: object, coroutine):
+        # Время обработки без ожидания очереди пользователя и свободного слота.
+        # Контекст для логов: обработка идет в отдельной задаче, поэтому он не протекает в другие
+        if isinstance(update, Update):
+            bind_update(update.update_id, update.effective_user.id if update.effective_user else None)
+        started = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            update_duration.observe(time.perf_counter() - started)
+            log_duration(logger, started, "Обновление обработано")
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,75 @@
+import asyncio
+import signal
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS, logger
+)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+def create_web_app(application: Application) -> web.Application:
+    """HTTP-сервер: прием обновлений от Telegram и проверка состояния"""
+    async def handle_update(request: web.Request) -> web.Response:
+        # Без секрета запросы не принимаются совсем (main не запускает вебхук без WEBHOOK_SECRET)
+        if not WEBHOOK_SECRET or request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            payload = await request.json()
+            if not isinstance(payload, dict):
+                return web.Response(status=400)
+            update = Update.de_json(payload, application.bot)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Не JSON или поля Update неверного типа
+            return web.Response(status=400)
+        # Обработка идет в фоне, Telegram получает ответ сразу
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        status = 200 if application.running else 503
+        return web.json_response({
+            'running': application.running,
+            'pending_updates': application.update_queue.qsize()
+        }, status=status)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get('/healthz', health)
+    return app
+
+async def run_webhook(application: Application):
+    """Аналог Application.run_polling для режима вебхука"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+
+    runner = web.AppRunner(create_web_app(application))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES
+        )
+        await application.start()
+        logger.info("Вебхук слушает %s:%s%s", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,127 @@
+"""Регрессионный тест планов запросов календаря и /myevents на базе с 1M событий.
+
+Схема создается настоящим init_database (с миграциями), данные загружаются
+рекурсивными CTE. Запросы перехватываются trace callback SQLite при вызове
+методов DatabaseHandler и проверяются через EXPLAIN QUERY PLAN: ни один не
+должен просматривать таблицу целиком. Размер базы - QUERY_PLAN_EVENTS.
+"""
+import os
+import re
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import database
+from database import ConnectionPool, DatabaseHandler, get_connection, init_database
+
+EVENTS = int(os.getenv('QUERY_PLAN_EVENTS', '1000000'))
+USERS = 50000
+DAYS = 4 * 365
+
+@pytest.fixture(scope='module')
+def big_database(tmp_path_factory):
+    previous = database.pool
+    database.pool = ConnectionPool(str(tmp_path_factory.mktemp('plans') / 'events.db'), 1)
+    try:
+        init_database()
+        conn = get_connection()
+        conn.execute('PRAGMA synchronous=OFF')
+        first_day = date(date.today().year - 2, 1, 1).isoformat()
+        with conn:
+            # События равномерно по DAYS дням, по два участника на событие
+            conn.execute('''
+                WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO events (date, time, starts_at, timezone, name, description, creator_id, max_participants)
+                SELECT day, '12:00', CAST(strftime('%s', day, '+12 hours') AS INTEGER), 'UTC', 'e', 'd', 1, 0
+                FROM (SELECT date(?, '+' || (i * ? / ?) || ' days') AS day FROM n)
+            ''', (EVENTS, first_day, DAYS, EVENTS))
+            conn.execute('''
+                INSERT OR IGNORE INTO participants (event_id, user_id, starts_at)
+                SELECT id, id * 7919 % ? + 1, starts_at FROM events
+                UNION ALL
+                SELECT id, id * 104729 % ? + 1, starts_at FROM events
+            ''', (USERS, USERS))
+        yield conn
+    finally:
+        database.pool.close()
+        database.pool = previous
+
+def plan(conn, statement: str) -> list:
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+
+def traced(conn, call) -> list:
+    statements = []
+
+    def trace(statement: str):
+        statement = ' '.join(statement.split())
+        if not statement.startswith(('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', '--')):
+            statements.append(statement)
+
+    conn.set_trace_callback(trace)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return statements
+
+def heavy_user(conn) -> int:
+    return conn.execute('''
+        SELECT user_id FROM participants GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()[0]
+
+CALENDAR_CALLS = {
+    'get_event_dates': lambda user: DatabaseHandler.get_event_dates(date.today().year, date.today().month),
+    'get_user_event_dates': lambda user: DatabaseHandler.get_user_event_dates(
+        user, date.today().year, date.today().month),
+    'get_calendar_dates': lambda user: DatabaseHandler.get_calendar_dates(
+        date.today().year, date.today().month, user),
+    'get_events_for_date': lambda user: DatabaseHandler.get_events_for_date(date.today().isoformat()),
+}
+
+@pytest.mark.parametrize('analyzed', [False, True], ids=['no-stats', 'analyzed'])
+@pytest.mark.parametrize('name', CALENDAR_CALLS)
+def test_calendar_queries_use_indexes(big_database, name, analyzed):
+    conn = big_database
+    if analyzed:
+        conn.execute('ANALYZE')
+    elif conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        # Без статистики: план, который получит база, где ANALYZE еще не выполнялся
+        conn.execute('DELETE FROM sqlite_stat1')
+        conn.execute('ANALYZE sqlite_schema')
+    conn.commit()
+    assert conn.execute('SELECT COUNT(*) FROM events').fetchone()[0] == EVENTS
+
+    user = heavy_user(conn)
+    statements = traced(conn, lambda: CALENDAR_CALLS[name](user))
+    assert statements
+    for statement in statements:
+        details = plan(conn, statement)
+        assert not [detail for detail in details if re.match(r'SCAN \w+', detail)], (statement, details)
+        assert any('INDEX' in detail or 'PRIMARY KEY' in detail for detail in details), (statement, details)
+
+@pytest.fixture(scope='module')
+def my_events_user(big_database) -> int:
+    """Пользователь с наибольшим числом предстоящих записей"""
+    return big_database.execute('''
+        SELECT user_id FROM participants WHERE starts_at >= CAST(strftime('%s', 'now') AS INTEGER)
+        GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()[0]
+
+@pytest.mark.parametrize('page', [None, 'after', 'before'], ids=['first', 'after', 'before'])
+def test_my_events_pages_seek_without_sorting(big_database, my_events_user, page):
+    conn = big_database
+    cursor = {}
+    if page:
+        last = DatabaseHandler.get_user_events_page(my_events_user, 2)[-1]
+        cursor = {page: (last[4], last[0])}
+    statements = traced(conn, lambda: DatabaseHandler.get_user_events_page(my_events_user, 10, **cursor))
+    assert statements
+    for statement in statements:
+        details = plan(conn, statement)
+        # Страница - диапазон индекса от курсора, а не сортировка всех записей пользователя
+        assert not [detail for detail in details if re.match(r'SCAN \w+', detail) or 'TEMP B-TREE' in detail], (
+            statement, details)
+        assert any('idx_participants_user_start' in detail for detail in details), (statement, details)